@@ -0,0 +1,59 @@
+import hashlib
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from typing import Optional
+
+AUTH_TOKEN_KEY = "auth-token:{}"
+
+
+def get_cache_key(key: str) -> str:
+    return AUTH_TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cache_key = get_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            cache.set(cache_key, credentials, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return credentials
+
+
+async def aauthenticate(request) -> Optional[tuple]:
+    header = get_authorization_header(request).split()
+    if len(header) == 2 and header[0].lower() == CachedTokenAuthentication.keyword.lower().encode():
+        credentials = await cache.aget(get_cache_key(header[1].decode()))
+        if credentials is not None:
+            return credentials
+
+    drf_request = Request(
+        request,
+        authenticators=[authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    try:
+        user = await sync_to_async(lambda: drf_request.user)()
+    except AuthenticationFailed:
+        return None
+    if not user.is_authenticated:
+        return None
+    return user, drf_request.auth
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance: Token, **kwargs):
+    cache.delete(get_cache_key(instance.key))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_user_tokens(sender, instance, created: bool, **kwargs):
+    if not created:
+        cache.delete_many([get_cache_key(key) for key in Token.objects.filter(user=instance).values_list("key", flat=True)])
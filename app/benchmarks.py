@@ -0,0 +1,251 @@
+import numpy as np
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from typing import Optional
+
+from app.detection import CHECKPOINT, detect_fraud
+from app.models import DetectionCheckpoint, Post, PostSummary, ScoreBucket, User, Vote
+
+BATCH_SIZE = 5000
+BURST_DURATION = timedelta(seconds=10)
+TAGS = ["python", "django", "postgres", "redis", "celery", "rust", "go", "devops"]
+
+
+@contextmanager
+def scratch_database(name: str):
+    # The benchmarks create the database they are given and drop it afterwards, so it has to be named
+    # explicitly and must be neither a configured database nor the one its test runs use
+    configured = set()
+    for database in settings.DATABASES.values():
+        configured |= {database["NAME"], database["TEST"]["NAME"] or f"test_{database['NAME']}"}
+    if name in configured:
+        raise CommandError(f"{name} is a configured database, the benchmarks need a scratch one of their own.")
+
+    database_name, test_settings = connection.settings_dict["NAME"], connection.settings_dict["TEST"]
+    connection.settings_dict["TEST"] = {**test_settings, "NAME": name}
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(database_name, verbosity=0)
+        connection.settings_dict["TEST"] = test_settings
+
+
+@dataclass
+class Dataset:
+    users: list = field(default_factory=list)
+    posts: list = field(default_factory=list)
+    votes: int = 0
+    fraudulent: set = field(default_factory=set)
+
+    def describe(self) -> dict:
+        return {
+            "users": len(self.users),
+            "posts": len(self.posts),
+            "votes": self.votes,
+            "fraudulent": len(self.fraudulent),
+        }
+
+
+def generate_dataset(
+        users: int = 1000,
+        posts: int = 100,
+        votes: int = 100000,
+        bursts: int = 10,
+        burst_size: int = 50,
+        seed: int = 0,
+        now: Optional[datetime] = None,
+) -> Dataset:
+    now = now or timezone.now()
+    rng = np.random.default_rng(seed)
+    dataset = Dataset()
+
+    dataset.users = [
+        User(username=f"benchmark-user-{index}", date_joined=now - timedelta(days=365))
+        for index in range(users)
+    ]
+    User.objects.bulk_create(dataset.users, batch_size=BATCH_SIZE)
+
+    # Every post has its own typical score and a long-tailed share of the votes
+    qualities = rng.uniform(1.5, 4.5, size=posts)
+    dataset.posts = [
+        Post(
+            author=dataset.users[rng.integers(users)],
+            title=f"benchmark post {index}",
+            content="benchmark",
+            tags=list(rng.choice(TAGS, size=rng.integers(1, 3), replace=False)),
+        )
+        for index in range(posts)
+    ]
+    Post.objects.bulk_create(dataset.posts, batch_size=BATCH_SIZE)
+
+    popularity = rng.pareto(1.5, size=posts) + 1
+    per_post = np.zeros(posts, dtype=np.int64)
+    remaining = min(votes, users * posts)
+    while remaining:
+        # Votes beyond one per user on a post spill over to the posts that still have voters left
+        weights = popularity * (per_post < users)
+        per_post += rng.multinomial(remaining, weights / weights.sum())
+        overflow = np.maximum(per_post - users, 0)
+        per_post -= overflow
+        remaining = int(overflow.sum())
+    batch = []
+    for post, quality, count in zip(dataset.posts, qualities, per_post):
+        voters = rng.choice(users, size=count, replace=False)
+        scores = np.clip(np.rint(rng.normal(quality, 1.0, size=count)), 0, 5).astype(int)
+        for voter, score in zip(voters, scores):
+            batch.append(Vote(user=dataset.users[voter], post=post, score=int(score)))
+        if len(batch) >= BATCH_SIZE:
+            Vote.objects.bulk_create(batch)
+            dataset.votes += len(batch)
+            batch = []
+    Vote.objects.bulk_create(batch)
+    dataset.votes += len(batch)
+
+    Vote.objects.update(
+        created_at=RawSQL("%s - random() * %s", (now, settings.FRAUD_DETECTION_BASELINE_WINDOW))
+    )
+
+    # A burst is a cluster of fresh accounts giving one post the score furthest from its usual one
+    for burst in range(bursts):
+        post_index = rng.integers(posts)
+        accounts = [
+            User(username=f"benchmark-burst-{burst}-{index}", date_joined=now)
+            for index in range(burst_size)
+        ]
+        User.objects.bulk_create(accounts, batch_size=BATCH_SIZE)
+        burst_votes = [
+            Vote(user=account, post=dataset.posts[post_index], score=0 if qualities[post_index] >= 2.5 else 5)
+            for account in accounts
+        ]
+        Vote.objects.bulk_create(burst_votes, batch_size=BATCH_SIZE)
+
+        started_at = now - BURST_DURATION - rng.uniform(0, 1) * (settings.FRAUD_DETECTION_WINDOW - BURST_DURATION)
+        Vote.objects.filter(pk__in=[vote.pk for vote in burst_votes]).update(
+            created_at=RawSQL("%s + random() * %s", (started_at, BURST_DURATION))
+        )
+        dataset.votes += len(burst_votes)
+        dataset.fraudulent.update(vote.pk for vote in burst_votes)
+
+    PostSummary.rebuild()
+    ScoreBucket.rebuild(now=now)
+    DetectionCheckpoint.objects.filter(name=CHECKPOINT).delete()
+    return dataset
+
+
+@dataclass
+class Measurement:
+    name: str
+    latencies: list = field(default_factory=list)
+    queries: int = 0
+    extra: dict = field(default_factory=dict)
+
+    @contextmanager
+    def measure(self):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            yield
+            self.latencies.append(time.perf_counter() - started)
+        self.queries += len(queries)
+
+    def summary(self) -> dict:
+        latencies = np.array(self.latencies or [0.0])
+        seconds = float(latencies.sum())
+        return {
+            "name": self.name,
+            "operations": len(self.latencies),
+            "seconds": seconds,
+            "throughput": len(self.latencies) / seconds if seconds else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+            "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+            "queries_per_operation": self.queries / len(self.latencies) if self.latencies else 0.0,
+            **self.extra,
+        }
+
+
+# Velocity limits would throttle the synthetic clients, which vote far faster than people
+@override_settings(VOTE_VELOCITY_LIMITS=[], VOTE_VELOCITY_NEW_ACCOUNT_LIMITS=[])
+def benchmark_cast_vote(dataset: Dataset, requests: int, seed: int = 0) -> Measurement:
+    rng = np.random.default_rng(seed)
+    measurement = Measurement("cast_vote")
+    client = APIClient()
+    for _ in range(requests):
+        client.force_authenticate(user=dataset.users[rng.integers(len(dataset.users))])
+        url = reverse(
+            "app:cast-vote",
+            kwargs={"post": dataset.posts[rng.integers(len(dataset.posts))].pk, "score": int(rng.integers(6))},
+        )
+        with measurement.measure():
+            client.post(url)
+    return measurement
+
+
+@override_settings(VOTE_VELOCITY_LIMITS=[], VOTE_VELOCITY_NEW_ACCOUNT_LIMITS=[])
+def benchmark_bulk_cast_vote(dataset: Dataset, requests: int, batch_size: int, seed: int = 0) -> Measurement:
+    rng = np.random.default_rng(seed)
+    measurement = Measurement("bulk_cast_vote", extra={"batch_size": batch_size})
+    client = APIClient()
+    for _ in range(requests):
+        client.force_authenticate(user=dataset.users[rng.integers(len(dataset.users))])
+        posts = rng.choice(len(dataset.posts), size=min(batch_size, len(dataset.posts)), replace=False)
+        votes = [{"post": str(dataset.posts[index].pk), "score": int(rng.integers(6))} for index in posts]
+        with measurement.measure():
+            client.post(reverse("app:bulk-cast-vote"), {"votes": votes}, format="json")
+    return measurement
+
+
+def benchmark_post_list(dataset: Dataset, requests: int, seed: int = 0) -> Measurement:
+    rng = np.random.default_rng(seed)
+    measurement = Measurement("post_list")
+    client = APIClient()
+    url = None
+    for _ in range(requests):
+        client.force_authenticate(user=dataset.users[rng.integers(len(dataset.users))])
+        with measurement.measure():
+            response = client.get(url or reverse("app:post-list"))
+        url = response.data["next"]
+    return measurement
+
+
+def benchmark_fraud_detection(dataset: Dataset, runs: int) -> Measurement:
+    measurement = Measurement("fraud_detection")
+    for _ in range(runs):
+        DetectionCheckpoint.objects.filter(name=CHECKPOINT).delete()
+        with measurement.measure():
+            report = detect_fraud(dry_run=True)
+
+    flagged = set(report.flagged)
+    measurement.extra = {
+        "candidates": report.candidates,
+        "votes_per_second": report.candidates / report.total_time if report.total_time else 0.0,
+        "flagged": len(flagged),
+        "fraudulent_flagged": len(flagged & dataset.fraudulent),
+    }
+    return measurement
+
+
+def run_benchmarks(
+        dataset: Dataset,
+        requests: int = 200,
+        batch_size: int = 50,
+        detection_runs: int = 3,
+        seed: int = 0,
+) -> list[dict]:
+    measurements = [
+        benchmark_cast_vote(dataset, requests=requests, seed=seed),
+        benchmark_bulk_cast_vote(dataset, requests=max(1, requests // 10), batch_size=batch_size, seed=seed),
+        benchmark_post_list(dataset, requests=requests, seed=seed),
+        benchmark_fraud_detection(dataset, runs=detection_runs),
+    ]
+    return [measurement.summary() for measurement in measurements]
@@ -0,0 +1,147 @@
+import secrets
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from typing import Any, Awaitable, Callable, Iterable, Optional
+from uuid import uuid4
+
+from app.routers import use_primary
+
+FRAUD_DETECTION_VOTES_KEY = "fraud-detection-votes"
+GENERATION_KEY = "generation:{}"
+POST_SUMMARY_KEY = "post-summary:{}"
+POST_SUMMARY_SHARDS_KEY = "post-summary-shards:{}"
+POST_WRITES_KEY = "post-writes:{}:{}"
+USER_SCORES_KEY = "user-scores:{}"
+USER_VOTES_VERSION_KEY = "user-votes-version:{}"
+VOTE_VELOCITY_KEY = "vote-velocity:{}:{}:{}"
+LOCK_KEY = "lock:{}"
+METRIC_KEY = "metric:{}"
+METRICS_INDEX_KEY = "metrics-index"
+
+
+def get_many(key_format: str, ids: Iterable[Any], load: Callable[[list], dict]) -> dict:
+    keys = {key_format.format(pk): pk for pk in ids}
+    # Values are stored under the generation their key had before the load, and invalidate() moves it on
+    # after the commit, so a value loaded from the state before a write is never read again
+    generations = get_versions(GENERATION_KEY, keys)
+    versioned = {f"{key}:{generations[key]}": pk for key, pk in keys.items()}
+    values = {versioned[key]: value for key, value in cache.get_many(list(versioned)).items()}
+
+    missing = [pk for pk in keys.values() if pk not in values]
+    if missing:
+        # Values cached from a lagging replica would outlive the lag, so they are loaded from the primary
+        with use_primary():
+            loaded = load(missing)
+        cache.set_many(
+            {key: loaded[pk] for key, pk in versioned.items() if pk in loaded},
+            timeout=settings.CACHE_TIMEOUT,
+        )
+        values.update(loaded)
+
+    return values
+
+
+async def aget_many(key_format: str, ids: Iterable[Any], aload: Callable[[list], Awaitable[dict]]) -> dict:
+    keys = {key_format.format(pk): pk for pk in ids}
+    generations = await aget_versions(GENERATION_KEY, keys)
+    versioned = {f"{key}:{generations[key]}": pk for key, pk in keys.items()}
+    values = {versioned[key]: value for key, value in (await cache.aget_many(list(versioned))).items()}
+
+    missing = [pk for pk in keys.values() if pk not in values]
+    if missing:
+        with use_primary():
+            loaded = await aload(missing)
+        await cache.aset_many(
+            {key: loaded[pk] for key, pk in versioned.items() if pk in loaded},
+            timeout=settings.CACHE_TIMEOUT,
+        )
+        values.update(loaded)
+
+    return values
+
+
+def invalidate(key_format: str, ids: Iterable[Any]):
+    keys = [GENERATION_KEY.format(key_format.format(pk)) for pk in ids]
+    if not keys:
+        return
+
+    # Moving on right away hides the old values from the writer's own transaction, and moving on again
+    # after commit orphans the values that readers loaded from the pre-commit state meanwhile
+    advance_versions(keys)
+    transaction.on_commit(lambda: advance_versions(keys))
+
+
+def forget(key_format: str, ids: Iterable[Any]):
+    # For values read with a plain cache.get, where a stale value is only a missed optimization
+    keys = [key_format.format(pk) for pk in ids]
+    if not keys:
+        return
+
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_versions(key_format: str, ids: Iterable[Any]) -> dict:
+    keys = {key_format.format(pk): pk for pk in ids}
+    versions = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+
+    # A version lost from the cache starts over at random rather than at zero, so it is not handed out twice
+    missing = {key: secrets.randbits(62) for key, pk in keys.items() if pk not in versions}
+    for key, version in missing.items():
+        if not cache.add(key, version, timeout=settings.CACHE_TIMEOUT):
+            version = cache.get(key, version)
+        versions[keys[key]] = version
+
+    return versions
+
+
+async def aget_versions(key_format: str, ids: Iterable[Any]) -> dict:
+    keys = {key_format.format(pk): pk for pk in ids}
+    versions = {keys[key]: value for key, value in (await cache.aget_many(list(keys))).items()}
+
+    missing = {key: secrets.randbits(62) for key, pk in keys.items() if pk not in versions}
+    for key, version in missing.items():
+        if not await cache.aadd(key, version, timeout=settings.CACHE_TIMEOUT):
+            version = await cache.aget(key, version)
+        versions[keys[key]] = version
+
+    return versions
+
+
+def bump_versions(key_format: str, ids: Iterable[Any]):
+    keys = [key_format.format(pk) for pk in ids]
+
+    # The version only moves once the change is visible, so a reader never pairs it with the old state
+    if keys:
+        transaction.on_commit(lambda: advance_versions(keys))
+
+
+def advance_versions(keys: list[str]):
+    # A missing version is left to start over at random when it is next read
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def increment(key: str, delta: int = 1, timeout: int = None) -> int:
+    cache.add(key, 0, timeout=timeout)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=timeout)
+        return delta
+
+
+def acquire_lock(name: str, timeout: int) -> Optional[str]:
+    token = str(uuid4())
+    if cache.add(LOCK_KEY.format(name), token, timeout=timeout):
+        return token
+    return None
+
+
+def release_lock(name: str, token: str):
+    if cache.get(LOCK_KEY.format(name)) == token:
+        cache.delete(LOCK_KEY.format(name))
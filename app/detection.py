@@ -0,0 +1,193 @@
+import numpy as np
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from django.conf import settings
+from django.db.models import QuerySet
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from typing import Optional
+
+from app.cache import acquire_lock, release_lock
+from app.models import DetectionCheckpoint, ScoreBucket, Vote
+from app.routers import reading_from, replica_for
+from app.detectors import get_detectors
+from app.scoring import BACKENDS, Candidates
+from app.statistics import ScoreHistogram, ScoreStatistics
+
+
+CHECKPOINT = "fraud_detection"
+
+
+@dataclass
+class Baselines:
+    overall: ScoreHistogram = field(default_factory=ScoreHistogram)
+    posts: dict = field(default_factory=dict)
+    tags: dict = field(default_factory=dict)
+    post_tags: dict = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, since: datetime) -> "Baselines":
+        baselines = cls()
+        tag_histograms = defaultdict(list)
+
+        for row in ScoreBucket.sums_by_post(since=since):
+            histogram = ScoreHistogram(tuple(row[f"total_{field}"] for field in ScoreBucket.HISTOGRAM_FIELDS))
+            baselines.posts[row["post"]] = histogram
+            baselines.post_tags[row["post"]] = row["post__tags"] or []
+            for tag in baselines.post_tags[row["post"]]:
+                tag_histograms[tag].append(histogram)
+
+        # Every post is in the rows already, so the overall baseline is their sum rather than a row of its own
+        baselines.overall = ScoreHistogram.merge(baselines.posts.values())
+        baselines.tags = {tag: ScoreHistogram.merge(histograms) for tag, histograms in tag_histograms.items()}
+        return baselines
+
+    def for_post(self, post_id) -> tuple[str, ScoreHistogram]:
+        minimum = settings.FRAUD_DETECTION_MIN_POST_VOTES
+        histogram = self.posts.get(post_id)
+        if histogram is not None and histogram.count >= minimum:
+            return "post", histogram
+
+        if settings.FRAUD_DETECTION_TAG_BASELINE:
+            # The narrowest tag with enough votes is the closest peer group of the post
+            tags = [
+                self.tags[tag] for tag in self.post_tags.get(post_id, [])
+                if self.tags[tag].count >= minimum
+            ]
+            if tags:
+                return "tag", min(tags, key=lambda tag_histogram: tag_histogram.count)
+
+        return "global", self.overall
+
+
+@dataclass
+class DetectionReport:
+    now: datetime
+    since: Optional[datetime] = None
+    skipped: bool = False
+    statistics: ScoreStatistics = field(default_factory=ScoreStatistics)
+    baselines: dict[str, Counter] = field(default_factory=dict)
+    detections: Counter = field(default_factory=Counter)
+    candidates: int = 0
+    flagged: list = field(default_factory=list)
+    reversal: dict = field(default_factory=dict)
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @contextmanager
+    def timer(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - started
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.timings.values())
+
+    def summary(self) -> dict:
+        return {
+            "skipped": self.skipped,
+            "candidates": self.candidates,
+            "detections": dict(self.detections),
+            "reversed": self.reversal.get("reversed", 0),
+            "timings": self.timings,
+        }
+
+
+def detection_since(now: datetime) -> datetime:
+    checkpoint, _ = DetectionCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    return max(
+        checkpoint.processed_until or now - settings.FRAUD_DETECTION_WINDOW,
+        now - settings.FRAUD_DETECTION_BASELINE_WINDOW,
+    )
+
+
+def advance_checkpoint(now: datetime):
+    # Votes committed late by slow transactions may carry a creation time
+    # slightly behind "now", so the most recent stretch is scanned again
+    DetectionCheckpoint.objects.get(name=CHECKPOINT).advance(now - settings.FRAUD_DETECTION_SETTLE_TIME)
+
+
+def in_shard(queryset: QuerySet, shard: int, shards: int) -> QuerySet:
+    if shards == 1:
+        return queryset
+    # Every vote of a post lands in the same shard, so per-post state such as trends is only touched by one of them
+    return queryset.annotate(
+        shard=RawSQL(f'mod(hashtext("{Vote._meta.db_table}"."post_id"::text) & 2147483647, %s)', (shards,)),
+    ).filter(shard=shard)
+
+
+def score_votes(now: datetime, since: datetime, dry_run: bool = False, shard: int = 0, shards: int = 1) -> DetectionReport:
+    report = DetectionReport(now=now, since=since)
+
+    # The window scans may read from the replica while its lag leaves half of the settle time to slow
+    # commits. The checkpoint moves past every vote the replica is missing, so its lag is measured
+    # right before the scans rather than taken from the cache, where it can be seconds old.
+    replica = replica_for(max_lag=settings.FRAUD_DETECTION_SETTLE_TIME.total_seconds() / 2, cached=False)
+    with report.timer("statistics"), reading_from(replica):
+        baselines = Baselines.load(since=now - settings.FRAUD_DETECTION_BASELINE_WINDOW)
+        report.statistics = baselines.overall.statistics
+
+    with report.timer("scoring"):
+        with reading_from(replica):
+            candidates = Candidates.load(
+                in_shard(
+                    Vote.objects.filter(
+                        reversed=False,
+                        created_at__gte=since,
+                        created_at__lte=now,
+                    ),
+                    shard=shard,
+                    shards=shards,
+                )
+                .order_by("created_at")
+            )
+        report.candidates = len(candidates)
+
+        detectors = get_detectors()
+        flagged = np.zeros(len(candidates), dtype=bool)
+        for detector in detectors:
+            post_baselines = detector.baselines(candidates, baselines)
+            report.baselines[detector.name] = Counter()
+            for (segment, _), votes in zip(post_baselines, candidates.votes_per_post()):
+                report.baselines[detector.name][segment] += int(votes)
+
+            z_scores = BACKENDS[settings.FRAUD_DETECTION_BACKEND](
+                candidates, [statistics for _, statistics in post_baselines],
+            )
+            detections = np.abs(z_scores) >= detector.threshold
+            report.detections[detector.name] = int(detections.sum())
+            flagged |= detections
+
+        report.flagged = [pk for pk, is_flagged in zip(candidates.pks, flagged) if is_flagged]
+
+    if not dry_run:
+        with report.timer("reversal"):
+            report.reversal = Vote.objects.filter(pk__in=report.flagged).bulk_reverse()
+
+        with report.timer("update"):
+            for detector in detectors:
+                detector.update(candidates, flagged)
+
+    return report
+
+
+def detect_fraud(now: Optional[datetime] = None, dry_run: bool = False) -> DetectionReport:
+    now = now or timezone.now()
+
+    lock = acquire_lock(CHECKPOINT, timeout=settings.FRAUD_DETECTION_LOCK_TIMEOUT)
+    if lock is None:
+        return DetectionReport(now=now, skipped=True)
+
+    try:
+        report = score_votes(now, detection_since(now), dry_run=dry_run)
+        if not dry_run:
+            advance_checkpoint(now)
+    finally:
+        release_lock(CHECKPOINT, lock)
+
+    return report
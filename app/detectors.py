@@ -0,0 +1,113 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from django.conf import settings
+from django.utils import timezone
+
+from app.models import PostScoreTrend
+from app.scoring import Candidates
+from app.statistics import ScoreStatistics
+
+
+class Detector(ABC):
+    name = None
+    # Replays keep the state between runs in memory instead of the database
+    persistent = True
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    # A (segment, statistics) pair for each post in candidates.post_ids
+    @abstractmethod
+    def baselines(self, candidates: Candidates, buckets) -> list[tuple[str, object]]:
+        pass
+
+    # Fold the accepted votes into whatever state the detector keeps between runs
+    def update(self, candidates: Candidates, flagged: np.ndarray):
+        pass
+
+
+class ZScoreDetector(Detector):
+    name = "z_score"
+
+    def baselines(self, candidates, buckets):
+        return [
+            (segment, histogram.statistics)
+            for segment, histogram in map(buckets.for_post, candidates.post_ids)
+        ]
+
+
+class MedianAbsoluteDeviationDetector(Detector):
+    name = "mad"
+
+    def baselines(self, candidates, buckets):
+        return [
+            (segment, histogram.robust_statistics)
+            for segment, histogram in map(buckets.for_post, candidates.post_ids)
+        ]
+
+
+class MovingAverageDetector(Detector):
+    name = "ewma"
+
+    def __init__(self, threshold: float, alpha: float = 0.05, min_votes: int = 30):
+        super().__init__(threshold)
+        self.alpha = alpha
+        self.min_votes = min_votes
+        self.trends = {}
+
+    def baselines(self, candidates, buckets):
+        if self.persistent:
+            self.trends = {
+                trend.post_id: trend
+                for trend in PostScoreTrend.objects.filter(post_id__in=candidates.post_ids)
+            }
+        baselines = []
+        for post_id in candidates.post_ids:
+            trend = self.trends.get(post_id)
+            if trend is None or trend.votes < self.min_votes:
+                baselines.append(("warming up", ScoreStatistics()))
+            else:
+                baselines.append(("post", trend.statistics))
+        return baselines
+
+    def update(self, candidates, flagged):
+        created = {}
+        changed = set()
+        for group, score, created_at, is_flagged in zip(
+                candidates.groups, candidates.scores, candidates.created_at, flagged,
+        ):
+            if is_flagged:
+                continue
+            post_id = candidates.post_ids[group]
+            trend = self.trends.get(post_id)
+            if trend is None:
+                trend = self.trends[post_id] = created[post_id] = PostScoreTrend(post_id=post_id)
+            # Votes near the checkpoint are scanned by two runs but folded only once
+            if trend.updated_until is not None and created_at <= trend.updated_until:
+                continue
+            trend.fold(int(score), created_at, alpha=self.alpha)
+            changed.add(post_id)
+
+        if not self.persistent:
+            return
+
+        now = timezone.now()
+        updated = [self.trends[post_id] for post_id in changed if post_id not in created]
+        for trend in updated:
+            trend.updated_at = now
+        fields = ["votes", "mean", "variance", "updated_until", "updated_at"]
+        PostScoreTrend.objects.bulk_update(updated, fields)
+        # A run that created the trend of a post meanwhile is overwritten rather than this run's folds dropped
+        PostScoreTrend.objects.bulk_create(
+            created.values(), update_conflicts=True, unique_fields=["post"], update_fields=fields,
+        )
+
+
+DETECTORS = {
+    detector.name: detector
+    for detector in (ZScoreDetector, MedianAbsoluteDeviationDetector, MovingAverageDetector)
+}
+
+
+def get_detectors() -> list[Detector]:
+    return [DETECTORS[name](**options) for name, options in settings.FRAUD_DETECTORS.items()]
@@ -0,0 +1,157 @@
+import csv
+import json
+from dataclasses import dataclass
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from typing import IO, Iterable, Iterator, Optional
+from uuid import UUID
+
+from app.cache import USER_SCORES_KEY, USER_VOTES_VERSION_KEY, bump_versions, invalidate
+from app.models import Post, PostSummary, ScoreBucket, User, Vote, VoteArchive
+from app.statistics import SCORES
+
+CHUNK_SIZE = 10000
+FORMATS = {"csv", "ndjson"}
+STAGING_TABLE = "vote_import"
+# "skip" keeps votes already cast through the site, "update" lets the imported score win
+CONFLICT_ACTIONS = {
+    "skip": "DO NOTHING",
+    "update": "DO UPDATE SET score = EXCLUDED.score, updated_at = EXCLUDED.updated_at",
+}
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    invalid: int = 0
+    staged: int = 0
+    unknown: int = 0
+    merged: int = 0
+    posts: int = 0
+
+
+def read_csv(file: IO) -> Iterator[dict]:
+    yield from csv.DictReader(file)
+
+
+def read_ndjson(file: IO) -> Iterator[Optional[dict]]:
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def parse_row(row: Optional[dict]) -> Optional[tuple]:
+    # Malformed rows are dropped here, since a single bad value would abort the whole COPY
+    try:
+        user_id, post_id = UUID(str(row["user"])), UUID(str(row["post"]))
+        score = int(row["score"])
+        created_at = parse_datetime(str(row["created_at"])) if row.get("created_at") else None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if score not in SCORES or (row.get("created_at") and (created_at is None or created_at.tzinfo is None)):
+        return None
+    return user_id, post_id, score, created_at
+
+
+def import_votes(rows: Iterable[Optional[dict]], on_conflict: str = "skip", chunk_size: int = CHUNK_SIZE) -> ImportReport:
+    report = ImportReport()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                user_id uuid NOT NULL,
+                post_id uuid NOT NULL,
+                score smallint NOT NULL,
+                created_at timestamptz
+            )
+            """
+        )
+        try:
+            with transaction.atomic():
+                merge(cursor, rows, on_conflict, report)
+
+            # Cached scores are dropped once the merge is visible, a chunk of voters at a time;
+            # there can be millions of them, so they are read back through a server-side cursor
+            with connection.chunked_cursor() as voters:
+                voters.execute(f"SELECT DISTINCT user_id FROM {STAGING_TABLE}")
+                while user_ids := voters.fetchmany(chunk_size):
+                    invalidate(USER_SCORES_KEY, [user_id for user_id, in user_ids])
+                    bump_versions(USER_VOTES_VERSION_KEY, [user_id for user_id, in user_ids])
+        finally:
+            cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+
+    return report
+
+
+def merge(cursor, rows: Iterable[Optional[dict]], on_conflict: str, report: ImportReport):
+    # Rows are streamed to the server as they are read, so the file is never held in memory
+    with cursor.copy(f"COPY {STAGING_TABLE} (user_id, post_id, score, created_at) FROM STDIN") as copy:
+        for row in rows:
+            report.rows += 1
+            values = parse_row(row)
+            if values is None:
+                report.invalid += 1
+                continue
+            copy.write_row(values)
+            report.staged += 1
+
+    cursor.execute(f"ANALYZE {STAGING_TABLE}")
+    cursor.execute(
+        f"""
+        SELECT count(*) FROM {STAGING_TABLE} staged
+        WHERE NOT EXISTS (SELECT 1 FROM {User._meta.db_table} WHERE id = staged.user_id)
+        OR NOT EXISTS (SELECT 1 FROM {Post._meta.db_table} WHERE id = staged.post_id)
+        """
+    )
+    report.unknown = cursor.fetchone()[0]
+
+    # Archived votes of the imported pairs come back first, so that the conflict handling applies to them too
+    cursor.execute(
+        VoteArchive.restore_sql(
+            f"SELECT DISTINCT user_id, post_id FROM {STAGING_TABLE}",
+            "SELECT count(*) FROM restored",
+        )
+    )
+
+    # The latest row wins when the file has several votes of a user on the same post,
+    # since one statement cannot insert and then update the same vote
+    cursor.execute(
+        f"""
+        INSERT INTO {Vote._meta.db_table} (id, created_at, updated_at, user_id, post_id, score, reversed)
+        SELECT gen_random_uuid(), coalesce(created_at, now()), now(), user_id, post_id, score, false
+        FROM (
+            SELECT DISTINCT ON (user_id, post_id) staged.*
+            FROM {STAGING_TABLE} staged
+            JOIN {User._meta.db_table} voter ON voter.id = staged.user_id
+            JOIN {Post._meta.db_table} post ON post.id = staged.post_id
+            ORDER BY user_id, post_id, created_at DESC NULLS LAST
+        ) latest
+        ON CONFLICT (user_id, post_id) {CONFLICT_ACTIONS[on_conflict]}
+        """
+    )
+    report.merged = cursor.rowcount
+
+    cursor.execute(
+        f"""
+        SELECT DISTINCT post_id FROM {STAGING_TABLE}
+        WHERE post_id IN (SELECT id FROM {Post._meta.db_table})
+        """
+    )
+    report.posts = PostSummary.rebuild(post_id for post_id, in cursor.fetchall())
+    # The imported votes, and the votes whose score an import updated, are recounted in their buckets
+    ScoreBucket.rebuild(
+        f"""
+        SELECT vote.post_id, vote.created_at FROM {Vote._meta.db_table} vote
+        JOIN (SELECT DISTINCT user_id, post_id FROM {STAGING_TABLE}) staged
+        ON staged.user_id = vote.user_id AND staged.post_id = vote.post_id
+        """
+    )
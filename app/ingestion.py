@@ -0,0 +1,187 @@
+import json
+import redis
+import time
+from collections import deque
+from django.conf import settings
+from django.core.cache import cache
+from django.db import InterfaceError, OperationalError, transaction
+from functools import lru_cache
+from typing import Optional
+from uuid import uuid4
+
+from app.cache import acquire_lock, release_lock
+from app.metrics import registry
+from app.models import Vote
+
+VOTE_STATUS_KEY = "vote-status:{}"
+PENDING = "pending"
+FAILED = "failed"
+DRAIN = "vote_queue_drain"
+
+
+@lru_cache
+def get_client(url: str) -> redis.Redis:
+    return redis.Redis.from_url(url)
+
+
+class VoteQueue:
+    # Stand-ins for the Redis lists when VOTE_QUEUE_URL is empty, e.g. in tests
+    local = deque()
+    local_processing = deque()
+    local_dead = deque()
+
+    def __init__(self, url: Optional[str] = None):
+        url = url or settings.VOTE_QUEUE_URL
+        self.client = get_client(url) if url else None
+
+    def push(self, *payloads: dict):
+        if self.client is None:
+            self.local.extend(json.dumps(payload) for payload in payloads)
+        else:
+            self.client.rpush(settings.VOTE_QUEUE_KEY, *(json.dumps(payload) for payload in payloads))
+
+    def claim(self, count: int) -> list[tuple[str, dict]]:
+        # Claimed payloads move to the processing list and stay there until they are acknowledged,
+        # so the votes of a worker that dies before its commit are not lost
+        if self.client is None:
+            claimed = [self.local.popleft() for _ in range(min(count, len(self.local)))]
+            self.local_processing.extend(claimed)
+        else:
+            pipeline = self.client.pipeline(transaction=False)
+            for _ in range(count):
+                pipeline.lmove(settings.VOTE_QUEUE_KEY, settings.VOTE_QUEUE_PROCESSING_KEY, "LEFT", "RIGHT")
+            claimed = [payload for payload in pipeline.execute() if payload is not None]
+        return [(raw, json.loads(raw)) for raw in claimed]
+
+    def ack(self, *raws: str):
+        if self.client is None:
+            for raw in raws:
+                self.local_processing.remove(raw)
+        elif raws:
+            pipeline = self.client.pipeline(transaction=False)
+            for raw in raws:
+                pipeline.lrem(settings.VOTE_QUEUE_PROCESSING_KEY, 1, raw)
+            pipeline.execute()
+
+    def dead_letter(self, *raws: str):
+        if self.client is None:
+            self.local_dead.extend(raws)
+        elif raws:
+            self.client.rpush(settings.VOTE_QUEUE_DEAD_LETTER_KEY, *raws)
+        self.ack(*raws)
+
+    def recover(self) -> int:
+        # Payloads left in processing by a crashed worker go back to the front of the queue, in order
+        if self.client is None:
+            recovered = len(self.local_processing)
+            self.local.extendleft(reversed(self.local_processing))
+            self.local_processing.clear()
+            return recovered
+        recovered = 0
+        while self.client.lmove(settings.VOTE_QUEUE_PROCESSING_KEY, settings.VOTE_QUEUE_KEY, "RIGHT", "LEFT"):
+            recovered += 1
+        return recovered
+
+    def dead_letters(self) -> int:
+        if self.client is None:
+            return len(self.local_dead)
+        return self.client.llen(settings.VOTE_QUEUE_DEAD_LETTER_KEY)
+
+    def __len__(self):
+        if self.client is None:
+            return len(self.local)
+        return self.client.llen(settings.VOTE_QUEUE_KEY)
+
+
+def enqueue_vote(user_id, post_id, score: int, reverse: bool = False) -> str:
+    token = str(uuid4())
+    cache.set(
+        VOTE_STATUS_KEY.format(token),
+        {"user": str(user_id), "status": PENDING},
+        timeout=settings.VOTE_STATUS_TIMEOUT,
+    )
+    payload = {"token": token, "user": str(user_id), "post": str(post_id), "score": score}
+    if reverse:
+        payload["reverse"] = True
+    VoteQueue().push(payload)
+    return token
+
+
+def get_vote_status(token, user_id) -> Optional[dict]:
+    vote_status = cache.get(VOTE_STATUS_KEY.format(token))
+    if vote_status is None or vote_status["user"] != str(user_id):
+        return None
+    return vote_status
+
+
+def cast(payloads: list[dict]) -> list[dict]:
+    with transaction.atomic():
+        results = Vote.objects.bulk_cast(
+            (payload["user"], payload["post"], payload["score"]) for payload in payloads
+        )
+        # Votes accepted over the velocity limits are reversed as soon as they land
+        Vote.objects.for_ballots(
+            (payload["user"], payload["post"]) for payload in payloads if payload.get("reverse")
+        ).bulk_reverse()
+    return results
+
+
+def drain_votes(max_batches: Optional[int] = None) -> int:
+    queue = VoteQueue()
+    lock = acquire_lock(DRAIN, timeout=settings.VOTE_QUEUE_DRAIN_TIMEOUT)
+    if lock is None:
+        return 0
+
+    drained = 0
+    batches = 0
+    started = time.monotonic()
+    try:
+        # Only one drain runs at a time, so whatever is still in processing was left by a crash
+        queue.recover()
+        # Draining stops at half the lock timeout, so no other drain recovers payloads this one has not acknowledged
+        while (
+                (max_batches is None or batches < max_batches)
+                and time.monotonic() - started < settings.VOTE_QUEUE_DRAIN_TIMEOUT / 2
+        ):
+            claimed = queue.claim(settings.VOTE_BATCH_MAX_SIZE)
+            if not claimed:
+                break
+
+            payloads = [payload for _, payload in claimed]
+            try:
+                results = cast(payloads)
+                failed = []
+            except (OperationalError, InterfaceError):
+                # The database is unavailable, so the batch is left for the next drain to recover
+                raise
+            except Exception:
+                # One bad ballot must not hold up the queue, so the batch is retried ballot by ballot
+                results, failed = [], []
+                for raw, payload in claimed:
+                    try:
+                        results.extend(cast([payload]))
+                    except (OperationalError, InterfaceError):
+                        raise
+                    except Exception:
+                        results.append({"status": FAILED, "error": "The vote could not be applied."})
+                        failed.append(raw)
+                        registry.inc("vote_queue_dead_letters_total")
+
+            cache.set_many(
+                {
+                    VOTE_STATUS_KEY.format(payload["token"]): {
+                        "user": payload["user"],
+                        **{key: value for key, value in result.items() if key in ("status", "error")},
+                    }
+                    for payload, result in zip(payloads, results)
+                },
+                timeout=settings.VOTE_STATUS_TIMEOUT,
+            )
+            queue.dead_letter(*failed)
+            queue.ack(*(raw for raw, _ in claimed if raw not in failed))
+            drained += len(payloads)
+            batches += 1
+    finally:
+        release_lock(DRAIN, lock)
+
+    return drained
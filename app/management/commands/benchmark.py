@@ -0,0 +1,106 @@
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from app.benchmarks import generate_dataset, run_benchmarks, scratch_database
+
+
+class Command(BaseCommand):
+    help = "Measure vote ingestion, post listing and fraud detection against a synthetic dataset"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", required=True,
+            help="Scratch database to create for the run and drop afterwards, never one the project uses",
+        )
+        parser.add_argument("--users", type=int, default=1000, help="Regular accounts to generate")
+        parser.add_argument("--posts", type=int, default=100, help="Posts to generate")
+        parser.add_argument("--votes", type=int, default=100000, help="Regular votes to generate")
+        parser.add_argument("--bursts", type=int, default=10, help="Fraud bursts to generate")
+        parser.add_argument("--burst-size", type=int, default=50, help="Fresh accounts voting in each burst")
+        parser.add_argument("--requests", type=int, default=200, help="Requests issued to each endpoint")
+        parser.add_argument("--batch-size", type=int, default=50, help="Votes in each bulk cast request")
+        parser.add_argument("--detection-runs", type=int, default=3, help="Fraud detection passes to time")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic dataset and requests")
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+        parser.add_argument("--baseline", help="Compare with the JSON results of an earlier run")
+
+    def handle(self, *args, **options):
+        if options["detection_runs"] < 1:
+            raise CommandError("--detection-runs must be at least 1.")
+
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"]) as baseline_file:
+                    baseline = {result["name"]: result for result in json.load(baseline_file)["results"]}
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(f"Cannot read the baseline results: {error}")
+
+        # Keep the benchmark's cache entries apart from those of a live deployment sharing the cache,
+        # keep its reads off the replica of the live database, and accept the test client's host
+        caches = {alias: {**cache, "KEY_PREFIX": "benchmark"} for alias, cache in settings.CACHES.items()}
+        with scratch_database(options["database"]):
+            with override_settings(CACHES=caches, DATABASE_REPLICA=None, ALLOWED_HOSTS=["testserver"]):
+                started = time.perf_counter()
+                dataset = generate_dataset(
+                    users=options["users"],
+                    posts=options["posts"],
+                    votes=options["votes"],
+                    bursts=options["bursts"],
+                    burst_size=options["burst_size"],
+                    seed=options["seed"],
+                )
+                generation_seconds = time.perf_counter() - started
+
+                results = run_benchmarks(
+                    dataset,
+                    requests=options["requests"],
+                    batch_size=options["batch_size"],
+                    detection_runs=options["detection_runs"],
+                    seed=options["seed"],
+                )
+
+        self.stdout.write(f"Dataset: {dataset.describe()}, generated in {generation_seconds:.1f} s")
+        self.stdout.write(f"{'benchmark':<18}{'ops':>8}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'queries':>10}")
+        for result in results:
+            self.stdout.write(
+                f"{result['name']:<18}{result['operations']:>8}{result['throughput']:>10.1f}"
+                f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['queries_per_operation']:>10.1f}"
+            )
+
+        if baseline is not None:
+            self.compare(results, baseline)
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(
+                    {
+                        "created_at": timezone.now().isoformat(),
+                        "parameters": {
+                            key: options[key] for key in (
+                                "users", "posts", "votes", "bursts", "burst_size",
+                                "requests", "batch_size", "detection_runs", "seed",
+                            )
+                        },
+                        "dataset": dataset.describe(),
+                        "generation_seconds": generation_seconds,
+                        "results": results,
+                    },
+                    output,
+                    indent=2,
+                )
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def compare(self, results: list[dict], baseline: dict):
+        for result in results:
+            previous = baseline.get(result["name"])
+            if not previous or not previous["throughput"] or not previous["p99_ms"]:
+                continue
+            throughput = result["throughput"] / previous["throughput"] - 1
+            p99 = result["p99_ms"] / previous["p99_ms"] - 1
+            style = self.style.ERROR if throughput < -0.1 or p99 > 0.1 else self.style.SUCCESS
+            self.stdout.write(style(f"{result['name']}: throughput {throughput:+.1%}, p99 {p99:+.1%}"))
@@ -0,0 +1,103 @@
+import random
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.test.utils import override_settings
+
+from app.benchmarks import scratch_database
+from app.models import Post, PostSummary, User
+
+
+def atomic_update(post_id, score: int):
+    PostSummary.apply_delta(post_id=post_id, votes=1, score=score)
+
+
+@transaction.atomic
+def locked_update(post_id, score: int):
+    post_summary = PostSummary.objects.select_for_update().get(post_id=post_id)
+    post_summary.total_votes += 1
+    post_summary.score_sum += score
+    post_summary.save(update_fields=["total_votes", "score_sum"])
+
+
+class Command(BaseCommand):
+    help = "Measure PostSummary update throughput with many concurrent writers on a single post"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", required=True,
+            help="Scratch database to create for the run and drop afterwards, never one the project uses",
+        )
+        parser.add_argument(
+            "--writers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32],
+            help="Numbers of concurrent writers to measure",
+        )
+        parser.add_argument(
+            "--updates", type=int, default=200,
+            help="Updates issued by each writer",
+        )
+        parser.add_argument(
+            "--locked", action="store_true",
+            help="Also measure a select_for_update read-modify-write for comparison",
+        )
+        parser.add_argument(
+            "--sharded", action="store_true",
+            help="Also measure F() updates spread over the shard rows of a hot post",
+        )
+        parser.add_argument(
+            "--shards", type=int, default=settings.POST_SUMMARY_SHARDS,
+            help="Shard rows of the post in the sharded mode",
+        )
+
+    def handle(self, *args, **options):
+        # Each mode keeps its number of shards throughout, so the atomic mode measures the single row update
+        # rather than turning into sharded writes once the post crosses the sharding threshold
+        modes = {"atomic": (atomic_update, 0)}
+        if options["locked"]:
+            modes["locked"] = (locked_update, 0)
+        if options["sharded"]:
+            modes["sharded"] = (atomic_update, options["shards"])
+
+        # Keep the benchmark's cache entries apart from those of a live deployment sharing the cache
+        caches = {alias: {**cache, "KEY_PREFIX": "benchmark"} for alias, cache in settings.CACHES.items()}
+        with scratch_database(options["database"]):
+            author = User.objects.create(username="benchmark")
+            self.stdout.write(f"{'mode':<8}{'writers':>8}{'updates/s':>12}{'seconds':>10}")
+            for mode, (update, shards) in modes.items():
+                for writers in options["writers"]:
+                    post = Post.objects.create(author=author, title="benchmark", content="benchmark", tags=[])
+                    PostSummary.objects.create(post=post, shards=shards)
+
+                    with override_settings(CACHES=caches, POST_SUMMARY_SHARDS=shards, DATABASE_REPLICA=None):
+                        seconds = self.run_writers(update, post.pk, writers, options["updates"])
+                        total_votes = PostSummary.load_many([post.pk])[post.pk]["total_votes"]
+
+                    if total_votes != writers * options["updates"]:
+                        self.stderr.write(f"{mode} lost updates: {total_votes} recorded")
+                    self.stdout.write(
+                        f"{mode:<8}{writers:>8}{writers * options['updates'] / seconds:>12.0f}{seconds:>10.3f}"
+                    )
+
+    @staticmethod
+    def run_writers(update, post_id, writers: int, updates: int) -> float:
+        barrier = threading.Barrier(writers + 1)
+
+        def write():
+            try:
+                barrier.wait()
+                for _ in range(updates):
+                    update(post_id, random.randint(0, 5))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=write) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from app.detection import detect_fraud
+
+
+class Command(BaseCommand):
+    help = "Run a fraud detection pass and report per-stage timings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Score the candidate votes without reversing the flagged ones",
+        )
+
+    def handle(self, *args, **options):
+        report = detect_fraud(dry_run=options["dry_run"])
+        if report.skipped:
+            self.stdout.write(self.style.WARNING("Another fraud detection run is in progress"))
+            return
+
+        self.stdout.write(f"Window: {report.since} to {report.now}")
+        self.stdout.write(
+            f"Baseline: {report.statistics.count} votes, "
+            f"mean {report.statistics.mean:.3f}, "
+            f"standard deviation {report.statistics.standard_deviation:.3f}"
+        )
+        self.stdout.write(f"Candidates: {report.candidates}, flagged: {len(report.flagged)}")
+        for detector, baselines in report.baselines.items():
+            self.stdout.write(
+                f"{detector}: flagged {report.detections[detector]}, baselines "
+                + ", ".join(f"{segment} {count}" for segment, count in sorted(baselines.items()))
+            )
+        for stage, seconds in report.timings.items():
+            self.stdout.write(f"{stage}: {seconds * 1000:.2f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Total: {report.total_time * 1000:.2f} ms"))
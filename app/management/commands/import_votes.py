@@ -0,0 +1,37 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+
+from app.importing import CHUNK_SIZE, CONFLICT_ACTIONS, FORMATS, READERS, import_votes
+
+
+class Command(BaseCommand):
+    help = "Stream historical votes from a CSV or NDJSON file into the database through COPY"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File with user, post, score and optional created_at fields, or - for stdin")
+        parser.add_argument("--format", choices=sorted(FORMATS), help="Defaults to the extension of the file")
+        parser.add_argument(
+            "--on-conflict", choices=sorted(CONFLICT_ACTIONS), default="skip",
+            help="Whether a user's existing vote on a post is kept or overwritten by the imported one",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Voters whose cached scores are dropped at a time")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or path.rpartition(".")[2].lower()
+        if file_format not in FORMATS:
+            raise CommandError(f"Cannot tell the format of {path}, pass --format")
+
+        try:
+            file = sys.stdin if path == "-" else open(path, newline="")
+        except OSError as error:
+            raise CommandError(f"Cannot read the votes: {error}")
+
+        with file:
+            report = import_votes(READERS[file_format](file), options["on_conflict"], options["chunk_size"])
+
+        self.stdout.write(
+            f"Rows: {report.rows}, invalid: {report.invalid}, "
+            f"unknown user or post: {report.unknown}, merged: {report.merged}"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the summaries of {report.posts} posts"))
@@ -0,0 +1,101 @@
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from uuid import UUID
+
+from app.detectors import DETECTORS
+from app.replay import replay
+from app.scoring import BACKENDS
+
+
+class Command(BaseCommand):
+    help = "Replay recorded votes through fraud detectors under simulated time and measure their accuracy"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Start of the replay, defaults to a week before --until")
+        parser.add_argument("--until", help="End of the replay, defaults to now")
+        parser.add_argument(
+            "--detector", action="append", choices=sorted(DETECTORS),
+            help="Detector to replay, repeatable; defaults to FRAUD_DETECTORS",
+        )
+        parser.add_argument("--threshold", type=float, help="Threshold of every replayed detector")
+        parser.add_argument("--interval", type=int, default=60, help="Seconds of simulated time between detection runs")
+        parser.add_argument("--baseline-window", type=float, help="Hours of votes in the baselines")
+        parser.add_argument("--backend", choices=sorted(BACKENDS), help="Scoring backend")
+        parser.add_argument(
+            "--labels",
+            help="File with the ids of the fraudulent votes, one per line; defaults to the votes reversed at the time",
+        )
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        until = self.parse_moment(options["until"]) if options["until"] else timezone.now()
+        since = self.parse_moment(options["since"]) if options["since"] else until - timedelta(days=7)
+        if since >= until:
+            raise CommandError("--since must come before --until")
+
+        labels = None
+        if options["labels"]:
+            try:
+                with open(options["labels"]) as labels_file:
+                    labels = {UUID(line.strip()) for line in labels_file if line.strip()}
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Cannot read the labels: {error}")
+
+        detector_options = {
+            name: settings.FRAUD_DETECTORS.get(name, {"threshold": settings.Z_SCORE_THRESHOLD})
+            for name in options["detector"] or settings.FRAUD_DETECTORS
+        }
+        if options["threshold"] is not None:
+            detector_options = {
+                name: {**values, "threshold": options["threshold"]}
+                for name, values in detector_options.items()
+            }
+        detectors = [DETECTORS[name](**values) for name, values in detector_options.items()]
+
+        report = replay(
+            since=since,
+            until=until,
+            detectors=detectors,
+            labels=labels,
+            interval=timedelta(seconds=options["interval"]),
+            baseline_window=timedelta(hours=options["baseline_window"]) if options["baseline_window"] else None,
+            backend=options["backend"],
+        )
+        summary = report.summary()
+
+        self.stdout.write(f"Replayed {report.votes} votes from {since} to {until} in {report.runs} runs")
+        for name, values in detector_options.items():
+            self.stdout.write(f"{name}: {values}, flagged {report.detections[name]}")
+        self.stdout.write(
+            f"Flagged: {report.flagged}, labelled fraudulent: {report.labelled}, "
+            f"precision {report.precision:.3f}, recall {report.recall:.3f}"
+        )
+        self.stdout.write(f"Reversals per hour: {report.reversals_per_hour:.1f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Detector CPU: {report.cpu_seconds:.2f} s, {report.cpu_seconds_per_million_votes:.2f} s per million votes"
+        ))
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(
+                    {
+                        "since": since.isoformat(),
+                        "until": until.isoformat(),
+                        "detectors": detector_options,
+                        "interval": options["interval"],
+                        "results": summary,
+                    },
+                    output,
+                    indent=2,
+                )
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def parse_moment(self, value: str):
+        moment = parse_datetime(value)
+        if moment is None:
+            raise CommandError(f"Cannot parse {value} as a date and time")
+        return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
@@ -0,0 +1,186 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from functools import wraps
+from typing import Callable
+
+from app.cache import METRIC_KEY, METRICS_INDEX_KEY, increment
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+INFINITY = "+Inf"
+# Sums of seconds are kept as integer microseconds so that they can be incremented in the cache
+MICROSECONDS = 1000000
+
+
+class Registry:
+    # Observations are aggregated in memory and added to the shared counters in the cache
+    # at most once per METRICS_FLUSH_INTERVAL, so every web and worker process reports together
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)
+        self.registered = set()
+        self.flushed_at = time.monotonic()
+
+    def inc(self, name: str, value: int = 1, **labels):
+        with self.lock:
+            self.pending[series(name, labels)] += value
+
+    def observe(self, name: str, seconds: float, **labels):
+        bucket = next((str(bound) for bound in LATENCY_BUCKETS if seconds <= bound), INFINITY)
+        with self.lock:
+            self.pending[series(f"{name}_bucket", {**labels, "le": bucket})] += 1
+            self.pending[series(f"{name}_sum", labels)] += round(seconds * MICROSECONDS)
+            self.pending[series(f"{name}_count", labels)] += 1
+
+    def flush(self, force: bool = False):
+        if not force and time.monotonic() - self.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(int)
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return
+
+        for key, value in pending.items():
+            increment(METRIC_KEY.format(key), delta=value, timeout=None)
+
+        # The index is rewritten only when this process has series it has not seen listed yet
+        self.registered.update(pending)
+        index = cache.get(METRICS_INDEX_KEY, set())
+        if not self.registered <= index:
+            cache.set(METRICS_INDEX_KEY, index | self.registered, timeout=None)
+
+    def render(self) -> str:
+        self.flush(force=True)
+        index = sorted(cache.get(METRICS_INDEX_KEY, set()))
+        values = cache.get_many([METRIC_KEY.format(key) for key in index])
+
+        families = defaultdict(list)
+        types = {}
+        buckets = defaultdict(lambda: defaultdict(int))
+        for key in index:
+            name, labels = json.loads(key)
+            value = values.get(METRIC_KEY.format(key), 0)
+            family, _, suffix = name.rpartition("_")
+            if suffix == "bucket":
+                bound = labels.pop("le")
+                buckets[(family, series(family, labels))][bound] += value
+            elif suffix in ("sum", "count"):
+                types[family] = "histogram"
+                families[family].append(
+                    format_sample(name, labels, value / MICROSECONDS if suffix == "sum" else value)
+                )
+            else:
+                types[name] = "counter"
+                families[name].append(format_sample(name, labels, value))
+
+        bucket_lines = defaultdict(list)
+        for (family, key), counts in sorted(buckets.items()):
+            _, labels = json.loads(key)
+            cumulative = 0
+            for bound in [*map(str, LATENCY_BUCKETS), INFINITY]:
+                cumulative += counts.get(bound, 0)
+                bucket_lines[family].append(format_sample(f"{family}_bucket", {**labels, "le": bound}, cumulative))
+
+        lines = []
+        for family in sorted(families):
+            lines.append(f"# TYPE {family} {types[family]}")
+            lines.extend(bucket_lines[family] + families[family])
+        return "\n".join(lines) + "\n"
+
+
+def series(name: str, labels: dict) -> str:
+    return json.dumps([name, dict(sorted(labels.items()))], separators=(",", ":"))
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_sample(name: str, labels: dict, value) -> str:
+    if not labels:
+        return f"{name} {value}"
+    formatted = ",".join(f'{label}="{escape(label_value)}"' for label, label_value in sorted(labels.items()))
+    return f"{name}{{{formatted}}} {value}"
+
+
+registry = Registry()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# The counters of the requests and timers the current code runs in. Context variables follow a
+# request into the threads sync_to_async runs its queries in, where a wrapper entered on the
+# connection of the event loop thread would never see them
+query_counters: ContextVar[tuple[QueryCounter, ...]] = ContextVar("query_counters", default=())
+
+
+@contextmanager
+def counting_queries(counter: QueryCounter):
+    token = query_counters.set((*query_counters.get(), counter))
+    try:
+        yield counter
+    finally:
+        query_counters.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    counters = query_counters.get()
+    if not counters:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        for counter in counters:
+            counter.queries += 1
+            counter.seconds += seconds
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    # Every connection of every thread reports to the counters of the context that runs the query
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timer(name: str, count_queries: bool = False, **labels):
+    queries = QueryCounter()
+    started = time.perf_counter()
+    try:
+        if count_queries:
+            with counting_queries(queries):
+                yield
+        else:
+            yield
+    finally:
+        registry.observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+        if count_queries:
+            registry.inc(f"{name}_queries_total", queries.queries, **labels)
+        registry.flush()
+
+
+def timed(name: str, count_queries: bool = False, **labels) -> Callable:
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(name, count_queries=count_queries, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
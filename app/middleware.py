@@ -0,0 +1,43 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from app.metrics import QueryCounter, counting_queries, registry
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        with counting_queries(QueryCounter()) as queries:
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with counting_queries(QueryCounter()) as queries:
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    @staticmethod
+    def record(request, response, seconds: float, queries: QueryCounter):
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unmatched"
+        registry.observe(
+            "http_request_duration_seconds", seconds,
+            view=view, method=request.method, status=response.status_code,
+        )
+        registry.inc("http_request_queries_total", queries.queries, view=view)
+        registry.observe("http_request_query_duration_seconds", queries.seconds, view=view)
+        registry.flush()
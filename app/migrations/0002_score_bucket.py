@@ -0,0 +1,64 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:28
+
+import django.db.models.deletion
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_score_buckets(apps, schema_editor):
+    Vote = apps.get_model("app", "Vote")
+    ScoreBucket = apps.get_model("app", "ScoreBucket")
+
+    size = settings.SCORE_BUCKET_SIZE.total_seconds()
+    since = datetime.now(tz=timezone.utc) - settings.FRAUD_DETECTION_BASELINE_WINDOW - settings.SCORE_BUCKET_SIZE
+    sums = defaultdict(lambda: [0, 0, 0])
+
+    votes = Vote.objects.filter(reversed=False, created_at__gte=since).values_list("post_id", "created_at", "score")
+    for post_id, created_at, score in votes.iterator():
+        timestamp = created_at.timestamp()
+        started_at = datetime.fromtimestamp(timestamp - timestamp % size, tz=timezone.utc)
+        key = (post_id, started_at)
+        sums[key][0] += 1
+        sums[key][1] += score
+        sums[key][2] += score * score
+
+    ScoreBucket.objects.bulk_create(
+        [
+            ScoreBucket(
+                post_id=post_id, started_at=started_at,
+                count=count, score_sum=score_sum, score_squares_sum=score_squares_sum,
+            )
+            for (post_id, started_at), (count, score_sum, score_squares_sum) in sums.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreBucket',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Universally Unique Identifier')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('started_at', models.DateTimeField(verbose_name='Started at')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Count')),
+                ('score_sum', models.BigIntegerField(default=0, verbose_name='Score Sum')),
+                ('score_squares_sum', models.BigIntegerField(default=0, verbose_name='Score Squares Sum')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_buckets', to='app.post', verbose_name='Post')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('post', 'started_at'), name='unique_score_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_score_buckets, migrations.RunPython.noop),
+    ]
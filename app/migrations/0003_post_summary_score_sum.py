@@ -0,0 +1,41 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:02
+
+from django.db import migrations, models
+from django.db.models import Count, Sum, Q
+
+
+def recompute_post_summaries(apps, schema_editor):
+    Post = apps.get_model("app", "Post")
+    PostSummary = apps.get_model("app", "PostSummary")
+
+    totals = (
+        Post.objects
+        .filter(summary__isnull=False)
+        .annotate(
+            total_votes=Count("votes", filter=Q(votes__reversed=False)),
+            score_sum=Sum("votes__score", filter=Q(votes__reversed=False), default=0),
+        )
+        .values_list("pk", "total_votes", "score_sum")
+    )
+    for post_id, total_votes, score_sum in totals.iterator():
+        PostSummary.objects.filter(post_id=post_id).update(total_votes=total_votes, score_sum=score_sum)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_score_bucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postsummary',
+            name='score_sum',
+            field=models.BigIntegerField(default=0, verbose_name='Score Sum'),
+        ),
+        migrations.RunPython(recompute_post_summaries, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='postsummary',
+            name='average_score',
+        ),
+    ]
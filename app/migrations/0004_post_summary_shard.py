@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:34
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_post_summary_score_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postsummary',
+            name='shards',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Number of shard rows absorbing the writes of a hot post, 0 when the post is not sharded', verbose_name='Shards'),
+        ),
+        migrations.CreateModel(
+            name='PostSummaryShard',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Universally Unique Identifier')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('index', models.PositiveSmallIntegerField(verbose_name='Index')),
+                ('total_votes', models.BigIntegerField(default=0, verbose_name='Total Votes')),
+                ('score_sum', models.BigIntegerField(default=0, verbose_name='Score Sum')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summary_shards', to='app.post', verbose_name='Post')),
+            ],
+            options={
+                'unique_together': {('post', 'index')},
+            },
+        ),
+    ]
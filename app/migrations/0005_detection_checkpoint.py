@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:36
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_post_summary_shard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Universally Unique Identifier')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Name')),
+                ('processed_until', models.DateTimeField(blank=True, help_text='High-water mark of the vote creation times that have already been scored', null=True, verbose_name='Processed until')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:36
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('app', '0005_detection_checkpoint'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='scorebucket',
+            index=models.Index(fields=['started_at'], name='score_bucket_started_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='vote',
+            index=models.Index(condition=models.Q(('reversed', False)), fields=['created_at'], name='vote_unreversed_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='vote',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='vote_created_brin'),
+        ),
+    ]
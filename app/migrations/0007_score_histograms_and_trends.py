@@ -0,0 +1,83 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:46
+
+import django.db.models.deletion
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_score_histograms(apps, schema_editor):
+    Vote = apps.get_model("app", "Vote")
+    ScoreBucket = apps.get_model("app", "ScoreBucket")
+
+    size = settings.SCORE_BUCKET_SIZE.total_seconds()
+    since = datetime.now(tz=timezone.utc) - settings.FRAUD_DETECTION_BASELINE_WINDOW - settings.SCORE_BUCKET_SIZE
+    histograms = defaultdict(lambda: defaultdict(int))
+
+    votes = Vote.objects.filter(reversed=False, created_at__gte=since).values_list("post_id", "created_at", "score")
+    for post_id, created_at, score in votes.iterator():
+        timestamp = created_at.timestamp()
+        started_at = datetime.fromtimestamp(timestamp - timestamp % size, tz=timezone.utc)
+        histograms[(post_id, started_at)][f"score_{score}_count"] += 1
+
+    for (post_id, started_at), counts in histograms.items():
+        ScoreBucket.objects.filter(post_id=post_id, started_at=started_at).update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_vote_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scorebucket',
+            name='score_0_count',
+            field=models.BigIntegerField(default=0, verbose_name='Score 0 Count'),
+        ),
+        migrations.AddField(
+            model_name='scorebucket',
+            name='score_1_count',
+            field=models.BigIntegerField(default=0, verbose_name='Score 1 Count'),
+        ),
+        migrations.AddField(
+            model_name='scorebucket',
+            name='score_2_count',
+            field=models.BigIntegerField(default=0, verbose_name='Score 2 Count'),
+        ),
+        migrations.AddField(
+            model_name='scorebucket',
+            name='score_3_count',
+            field=models.BigIntegerField(default=0, verbose_name='Score 3 Count'),
+        ),
+        migrations.AddField(
+            model_name='scorebucket',
+            name='score_4_count',
+            field=models.BigIntegerField(default=0, verbose_name='Score 4 Count'),
+        ),
+        migrations.AddField(
+            model_name='scorebucket',
+            name='score_5_count',
+            field=models.BigIntegerField(default=0, verbose_name='Score 5 Count'),
+        ),
+        migrations.CreateModel(
+            name='PostScoreTrend',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Universally Unique Identifier')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('votes', models.BigIntegerField(default=0, verbose_name='Votes')),
+                ('mean', models.FloatField(default=0.0, verbose_name='Mean')),
+                ('variance', models.FloatField(default=0.0, verbose_name='Variance')),
+                ('updated_until', models.DateTimeField(blank=True, help_text='Creation time of the latest vote folded into the moving averages', null=True, verbose_name='Updated until')),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='score_trend', to='app.post', verbose_name='Post')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(backfill_score_histograms, migrations.RunPython.noop),
+    ]
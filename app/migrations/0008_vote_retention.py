@@ -0,0 +1,49 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:06
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_score_histograms_and_trends'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyScoreHistogram',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Universally Unique Identifier')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('day', models.DateField(verbose_name='Day')),
+                ('score_0_count', models.BigIntegerField(default=0, verbose_name='Score 0 Count')),
+                ('score_1_count', models.BigIntegerField(default=0, verbose_name='Score 1 Count')),
+                ('score_2_count', models.BigIntegerField(default=0, verbose_name='Score 2 Count')),
+                ('score_3_count', models.BigIntegerField(default=0, verbose_name='Score 3 Count')),
+                ('score_4_count', models.BigIntegerField(default=0, verbose_name='Score 4 Count')),
+                ('score_5_count', models.BigIntegerField(default=0, verbose_name='Score 5 Count')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_score_histograms', to='app.post', verbose_name='Post')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('post', 'day'), name='unique_daily_score_histogram')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VoteArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveSmallIntegerField(verbose_name='Vote Score')),
+                ('reversed', models.BooleanField(default=False, verbose_name='Reversed')),
+                ('day', models.DateField(help_text='Day the vote was cast on, which holds it in the daily histograms', verbose_name='Day')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_votes', to='app.post', verbose_name='Post')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_votes', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'post'), name='unique_archived_vote')],
+            },
+        ),
+    ]
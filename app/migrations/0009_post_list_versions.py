@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_vote_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postsummary',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, help_text='Bumped by every change of the totals; together with the versions of the shards it never repeats', verbose_name='Version'),
+        ),
+        migrations.AddField(
+            model_name='postsummaryshard',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Version'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_post_list_versions'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='scorebucket',
+            name='unique_score_bucket',
+        ),
+        migrations.AddField(
+            model_name='scorebucket',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Rows of a hot post share its writes like the summary shards, 0 when the post is not sharded', verbose_name='Shard'),
+        ),
+        migrations.AlterField(
+            model_name='postsummary',
+            name='score_sum',
+            field=models.BigIntegerField(default=0, help_text='Sum of the scores folded into this row; the shards of a hot post hold the rest until the next fold', verbose_name='Score Sum'),
+        ),
+        migrations.AlterField(
+            model_name='postsummary',
+            name='total_votes',
+            field=models.PositiveBigIntegerField(default=0, help_text='Votes folded into this row; the shards of a hot post hold the rest until the next fold', verbose_name='Total Votes'),
+        ),
+        migrations.AddConstraint(
+            model_name='scorebucket',
+            constraint=models.UniqueConstraint(fields=('post', 'started_at', 'shard'), name='unique_score_bucket'),
+        ),
+    ]
@@ -1,12 +1,43 @@
-import math
-from datetime import timedelta
+import operator
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from functools import reduce
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models, transaction
-from django.db.models import QuerySet
+from django.db import connection, models, transaction
+from django.db.models import F, QuerySet, Sum
+from django.db.models.expressions import RawSQL
 from django.utils import timezone
+from typing import Any, Iterable
+from uuid import UUID
 
+from app.cache import (
+    FRAUD_DETECTION_VOTES_KEY,
+    POST_SUMMARY_KEY,
+    POST_SUMMARY_SHARDS_KEY,
+    POST_WRITES_KEY,
+    USER_SCORES_KEY,
+    USER_VOTES_VERSION_KEY,
+    aget_many,
+    bump_versions,
+    forget,
+    get_many,
+    increment,
+    invalidate,
+)
+from app.metrics import timed, timer
+from app.routers import pin_to_primary
+from app.statistics import SCORES, ScoreStatistics
+from app.velocity import limit_velocity, queue_reversal
+from utils.constants import VoteStatus
 from utils.models import BaseModel
 
 
@@ -15,13 +46,32 @@ class User(BaseModel, AbstractUser):
         return self.username
 
     def vote(self, post: "Post", score: int) -> "Vote":
-        vote, _ = Vote.objects.update_or_create(
-            user=self,
-            post=post,
-            defaults={"score": score},
-        )
+        reverse = limit_velocity(self, [post.pk])
+        with transaction.atomic():
+            # The live vote is locked first, so one being archived meanwhile is restored once that commits
+            if not Vote.objects.select_for_update().filter(user=self, post=post).exists():
+                VoteArchive.restore([(self.pk, post.pk)])
+            vote, _ = Vote.objects.update_or_create(
+                user=self,
+                post=post,
+                defaults={"score": score},
+            )
+        pin_to_primary([self.pk])
+        if reverse:
+            queue_reversal([(self.pk, post.pk)])
         return vote
 
+    def vote_many(self, votes: Iterable[tuple[Any, int]]) -> list[dict]:
+        votes = list(votes)
+        reverse = limit_velocity(self, [post_id for post_id, _ in votes])
+        results = Vote.objects.bulk_cast((self.pk, post_id, score) for post_id, score in votes)
+        if reverse:
+            queue_reversal(
+                (self.pk, result["post"]) for result in results
+                if result["status"] != VoteStatus.REJECTED.value
+            )
+        return results
+
 
 class Post(BaseModel):
     author = models.ForeignKey(
@@ -43,6 +93,167 @@ class Post(BaseModel):
         return self.title
 
 
+class VoteQuerySet(models.QuerySet):
+    @timed("vote_bulk_cast", count_queries=True)
+    def bulk_cast(self, ballots: Iterable[tuple[Any, Any, int]]) -> list[dict]:
+        results = [
+            {"user": user_id, "post": post_id, "score": score, "status": None}
+            for user_id, post_id, score in ballots
+        ]
+        if len(results) > settings.VOTE_BATCH_MAX_SIZE:
+            raise ValidationError(f"Ensure this batch has no more than {settings.VOTE_BATCH_MAX_SIZE} votes.")
+
+        for result in results:
+            result["user"] = UUID(str(result["user"]))
+            try:
+                result["post"] = UUID(str(result["post"]))
+            except ValueError:
+                pass
+
+        existing_posts = set(
+            Post.objects
+            .filter(pk__in={result["post"] for result in results if isinstance(result["post"], UUID)})
+            .values_list("pk", flat=True)
+        )
+
+        accepted = {}
+        for result in results:
+            if not isinstance(result["score"], int) or not 0 <= result["score"] <= 5:
+                result["status"] = VoteStatus.REJECTED.value
+                result["error"] = "Ensure the score is an integer between 0 and 5."
+            elif result["post"] not in existing_posts:
+                result["status"] = VoteStatus.REJECTED.value
+                result["error"] = "Post does not exist."
+            else:
+                key = (result["user"], result["post"])
+                if key in accepted:
+                    accepted[key]["status"] = VoteStatus.SUPERSEDED.value
+                accepted[key] = result
+
+        if not accepted:
+            return results
+
+        with transaction.atomic():
+            with timer("row_lock_statement", lock="votes"):
+                previous = {
+                    (vote.user_id, vote.post_id): vote
+                    for vote in (
+                        self.model.objects
+                        .for_ballots(accepted)
+                        .select_for_update()
+                        .order_by("user_id", "post_id")
+                        .only("pk", "user_id", "post_id", "score", "reversed", "created_at")
+                    )
+                }
+            # Votes past the retention age are archived and come back when they are cast again
+            restored = VoteArchive.restore(key for key in accepted if key not in previous)
+            previous.update({(vote.user_id, vote.post_id): vote for vote in restored})
+
+            votes = {}
+            summary_deltas = defaultdict(lambda: [0, 0])
+            bucket_changes = []
+            for key, result in accepted.items():
+                old_vote = previous.get(key)
+                if old_vote is None:
+                    result["status"] = VoteStatus.CREATED.value
+                    summary_deltas[key[1]][0] += 1
+                    summary_deltas[key[1]][1] += result["score"]
+                elif old_vote.score == result["score"]:
+                    result["status"] = VoteStatus.UNCHANGED.value
+                    continue
+                else:
+                    result["status"] = VoteStatus.UPDATED.value
+                    if not old_vote.reversed:
+                        summary_deltas[key[1]][1] += result["score"] - old_vote.score
+                        bucket_changes.append((key[1], old_vote.created_at, old_vote.score, -1))
+                        bucket_changes.append((key[1], old_vote.created_at, result["score"], 1))
+                votes[key] = self.model(user_id=key[0], post_id=key[1], score=result["score"])
+
+            self.model.objects.bulk_create(
+                votes.values(),
+                update_conflicts=True,
+                unique_fields=["user", "post"],
+                update_fields=["score", "updated_at"],
+            )
+            bucket_changes.extend(
+                (vote.post_id, vote.created_at, vote.score, 1)
+                for key, vote in votes.items() if key not in previous
+            )
+
+            for post_id in sorted(summary_deltas, key=str):
+                votes_delta, score_delta = summary_deltas[post_id]
+                PostSummary.apply_delta(post_id=post_id, votes=votes_delta, score=score_delta)
+            ScoreBucket.record_many(bucket_changes)
+            invalidate(USER_SCORES_KEY, {user_id for user_id, _ in votes})
+            bump_versions(USER_VOTES_VERSION_KEY, {user_id for user_id, _ in votes})
+            pin_to_primary({user_id for user_id, _ in votes})
+            DetectionCheckpoint.record_votes(len(votes.keys() - previous.keys()))
+
+        return results
+
+    def for_ballots(self, ballots: Iterable[tuple[Any, Any]]) -> QuerySet:
+        ballots = list(ballots)
+        if not ballots:
+            return self.none()
+        return self.filter(
+            reduce(operator.or_, (models.Q(user_id=user_id, post_id=post_id) for user_id, post_id in ballots))
+        )
+
+    def bulk_reverse(self) -> dict:
+        report = {"reversed": 0, "posts": {}, "votes": []}
+        with transaction.atomic():
+            with timer("row_lock_statement", lock="votes"):
+                votes = list(
+                    self.filter(reversed=False)
+                    .select_for_update()
+                    .order_by("pk")
+                    .values_list("pk", "user_id", "post_id", "score", "created_at")
+                )
+            if not votes:
+                return report
+
+            self.model.objects.filter(pk__in=[pk for pk, *_ in votes]).update(reversed=True, updated_at=timezone.now())
+
+            for pk, _, post_id, score, _ in votes:
+                post_report = report["posts"].setdefault(post_id, {"votes": 0, "score": 0})
+                post_report["votes"] += 1
+                post_report["score"] += score
+                report["votes"].append(pk)
+            report["reversed"] = len(votes)
+
+            for post_id in sorted(report["posts"], key=str):
+                PostSummary.apply_delta(
+                    post_id=post_id,
+                    votes=-report["posts"][post_id]["votes"],
+                    score=-report["posts"][post_id]["score"],
+                )
+            ScoreBucket.record_many((post_id, created_at, score, -1) for _, _, post_id, score, created_at in votes)
+            invalidate(USER_SCORES_KEY, {user_id for _, user_id, *_ in votes})
+
+        return report
+
+    def cached_user_scores(self, user_id) -> dict:
+        return get_many(USER_SCORES_KEY, [user_id], self._load_user_scores)[user_id]
+
+    async def acached_user_scores(self, user_id) -> dict:
+        return (await aget_many(USER_SCORES_KEY, [user_id], self._aload_user_scores))[user_id]
+
+    def _load_user_scores(self, user_ids: list) -> dict:
+        return {user_id: dict(self._user_scores(user_id)) for user_id in user_ids}
+
+    async def _aload_user_scores(self, user_ids: list) -> dict:
+        user_scores = {}
+        for user_id in user_ids:
+            user_scores[user_id] = {post_id: score async for post_id, score in self._user_scores(user_id)}
+        return user_scores
+
+    def _user_scores(self, user_id) -> QuerySet:
+        return (
+            self.model.objects.filter(user_id=user_id).values_list("post_id", "score")
+            .union(VoteArchive.objects.filter(user_id=user_id).values_list("post_id", "score"), all=True)
+        )
+
+
 class Vote(BaseModel):
     user = models.ForeignKey(
         User, verbose_name="Vote",
@@ -62,60 +273,102 @@ class Vote(BaseModel):
         default=False,
     )
 
+    objects = VoteQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user} on {self.post}: {self.score}"
 
+    @timed("vote_save", count_queries=True)
     def save(self, *args, **kwargs):
         self.full_clean()
 
         if self._state.adding:
             super().save(*args, **kwargs)
             PostSummary.update(post=self.post, new_score=self.score)
+            ScoreBucket.record(post_id=self.post_id, created_at=self.created_at, score=self.score)
+            DetectionCheckpoint.record_votes()
         else:
-            old_score: int = Vote.objects.get(pk=self.pk).score
+            old_score, old_reversed = Vote.objects.values_list("score", "reversed").get(pk=self.pk)
             super().save(*args, **kwargs)
-            PostSummary.update(post=self.post, new_score=self.score, old_score=old_score)
+            if not old_reversed and old_score != self.score:
+                PostSummary.update(post=self.post, new_score=self.score, old_score=old_score)
+            if not old_reversed:
+                ScoreBucket.record(post_id=self.post_id, created_at=self.created_at, score=old_score, votes=-1)
+            if not self.reversed:
+                ScoreBucket.record(post_id=self.post_id, created_at=self.created_at, score=self.score)
+
+        invalidate(USER_SCORES_KEY, [self.user_id])
+        bump_versions(USER_VOTES_VERSION_KEY, [self.user_id])
 
     def reverse(self):
-        PostSummary.update(post=self.post, new_score=self.score, reverse=True)
+        Vote.objects.filter(pk=self.pk).bulk_reverse()
         self.reversed = True
-        self.save(update_fields=["reversed"])
 
     def z_score(self, recent_votes: "QuerySet[Vote]"):
-        total_votes = recent_votes.count()
-        if total_votes == 0:
-            return None
-
-        mean = recent_votes.aggregate(models.Avg("score"))["score__avg"]
-        variance = sum((vote.score - mean) ** 2 for vote in recent_votes) / total_votes
-        standard_deviation = math.sqrt(variance)
-
-        if standard_deviation == 0:
-            return 0
-
-        z_score = (self.score - mean) / standard_deviation
-        return z_score
+        return ScoreStatistics.from_queryset(recent_votes).z_score(self.score)
 
     class Meta:
         unique_together = ("user", "post",)
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(reversed=False),
+                name="vote_unreversed_created_idx",
+            ),
+            BrinIndex(
+                fields=["created_at"],
+                name="vote_created_brin",
+            ),
+        ]
 
 
 class PostSummary(BaseModel):
     post = models.OneToOneField(Post, verbose_name="Post", on_delete=models.CASCADE, related_name="summary")
     total_votes = models.PositiveBigIntegerField(
         verbose_name="Total Votes",
+        help_text="Votes folded into this row; the shards of a hot post hold the rest until the next fold",
+        default=0,
+    )
+    score_sum = models.BigIntegerField(
+        verbose_name="Score Sum",
+        help_text="Sum of the scores folded into this row; the shards of a hot post hold the rest until the next fold",
         default=0,
     )
-    average_score = models.DecimalField(
-        verbose_name="Average Score",
-        max_digits=4, decimal_places=3, default=0.0,
+    shards = models.PositiveSmallIntegerField(
+        verbose_name="Shards",
+        help_text="Number of shard rows absorbing the writes of a hot post, 0 when the post is not sharded",
+        default=0,
+    )
+    version = models.PositiveBigIntegerField(
+        verbose_name="Version",
+        help_text="Bumped by every change of the totals; together with the versions of the shards it never repeats",
+        default=0,
     )
 
     def __str__(self):
         return f"Post: {self.post}, Total Votes: {self.total_votes}, Average Score: {self.average_score}"
 
+    @property
+    def totals(self) -> tuple[int, int]:
+        # The row alone misses the votes that the shards of a hot post have not folded in yet
+        shards = PostSummaryShard.objects.filter(post_id=self.post_id).aggregate(
+            total_votes=Sum("total_votes", default=0),
+            score_sum=Sum("score_sum", default=0),
+        )
+        return self.total_votes + shards["total_votes"], self.score_sum + shards["score_sum"]
+
+    @property
+    def average_score(self) -> Decimal:
+        total_votes, score_sum = self.totals
+        return self.average(total_votes=total_votes, score_sum=score_sum)
+
+    @staticmethod
+    def average(total_votes: int, score_sum: int) -> Decimal:
+        if not total_votes:
+            return Decimal(0)
+        return (Decimal(score_sum) / total_votes).quantize(Decimal("0.001"))
+
     @classmethod
-    @transaction.atomic
     def update(
             cls,
             post: Post,
@@ -124,28 +377,669 @@ class PostSummary(BaseModel):
             reverse: bool = False,
             *args,
             **kwargs,
-    ) -> "PostSummary":
+    ):
         if old_score is not None and reverse:
             raise Exception("Can't update and reverse vote at the same time")
 
-        post_summary, _ = cls.objects.select_for_update().get_or_create(post=post)
-        new_votes: int = 1
-
         if reverse:
-            new_votes *= -1
-            new_score *= -1
+            cls.apply_delta(post_id=post.pk, votes=-1, score=-new_score)
+        elif old_score is None:
+            cls.apply_delta(post_id=post.pk, votes=1, score=new_score)
+        else:
+            cls.apply_delta(post_id=post.pk, votes=0, score=new_score - old_score)
+
+    @classmethod
+    @timed("post_summary_update")
+    def apply_delta(cls, post_id, votes: int, score: int):
+        values = {
+            "total_votes": F("total_votes") + votes,
+            "score_sum": F("score_sum") + score,
+            "version": F("version") + 1,
+        }
+        shards = cls.shard_count(post_id)
+        # Timed as a whole, so the wait for concurrent writers to commit is included but not told apart
+        with timer("row_lock_statement", lock="post_summary_shard" if shards else "post_summary"):
+            if shards:
+                shard = {"post_id": post_id, "index": random.randrange(shards)}
+                if not PostSummaryShard.objects.filter(**shard).update(**values):
+                    PostSummaryShard.objects.get_or_create(**shard)
+                    PostSummaryShard.objects.filter(**shard).update(**values)
+            else:
+                post_summaries = cls.objects.filter(post_id=post_id)
+                if not post_summaries.update(**values):
+                    cls.objects.get_or_create(post_id=post_id)
+                    post_summaries.update(**values)
+
+        invalidate(POST_SUMMARY_KEY, [post_id])
+        cls.track_write(post_id)
+
+    @classmethod
+    def shard_count(cls, post_id) -> int:
+        key = POST_SUMMARY_SHARDS_KEY.format(post_id)
+        shards = cache.get(key)
+        if shards is None:
+            shards = cls.objects.filter(post_id=post_id).values_list("shards", flat=True).first() or 0
+            cache.set(key, shards, timeout=settings.CACHE_TIMEOUT)
+        return shards
+
+    @classmethod
+    def track_write(cls, post_id):
+        if not settings.POST_SUMMARY_SHARDS:
+            return
+
+        window = settings.POST_SUMMARY_SHARDING_WINDOW.total_seconds()
+        writes = increment(
+            POST_WRITES_KEY.format(post_id, int(time.time() // window)),
+            timeout=int(window) * 2,
+        )
+        if writes == settings.POST_SUMMARY_SHARDING_THRESHOLD:
+            cls.objects.filter(post_id=post_id, shards=0).update(shards=settings.POST_SUMMARY_SHARDS)
+            forget(POST_SUMMARY_SHARDS_KEY, [post_id])
+
+    @classmethod
+    def is_hot(cls, post_id) -> bool:
+        window = int(time.time() // settings.POST_SUMMARY_SHARDING_WINDOW.total_seconds())
+        writes = cache.get_many([POST_WRITES_KEY.format(post_id, window - 1), POST_WRITES_KEY.format(post_id, window)])
+        return max(writes.values(), default=0) >= settings.POST_SUMMARY_SHARDING_THRESHOLD
+
+    @classmethod
+    def fold_shards(cls) -> int:
+        post_ids = (
+            set(cls.objects.filter(shards__gt=0).values_list("post_id", flat=True)) |
+            set(PostSummaryShard.objects.exclude(total_votes=0, score_sum=0).values_list("post_id", flat=True))
+        )
+        folded = 0
+        for post_id in post_ids:
+            with transaction.atomic():
+                shards = list(
+                    PostSummaryShard.objects
+                    .select_for_update()
+                    .filter(post_id=post_id)
+                    .order_by("index")
+                )
+                # The versions move into the summary along with the totals, so their sum carries on counting
+                cls.objects.filter(post_id=post_id).update(
+                    total_votes=F("total_votes") + sum(shard.total_votes for shard in shards),
+                    score_sum=F("score_sum") + sum(shard.score_sum for shard in shards),
+                    version=F("version") + sum(shard.version for shard in shards),
+                )
+
+                if cls.is_hot(post_id):
+                    PostSummaryShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(
+                        total_votes=0, score_sum=0, version=0,
+                    )
+                else:
+                    PostSummaryShard.objects.filter(pk__in=[shard.pk for shard in shards]).delete()
+                    cls.objects.filter(post_id=post_id).update(shards=0)
+                    forget(POST_SUMMARY_SHARDS_KEY, [post_id])
+
+            folded += 1
+        return folded
+
+    @classmethod
+    def rebuild(cls, post_ids: Iterable = None) -> int:
+        posts = Post.objects.all() if post_ids is None else Post.objects.filter(pk__in=list(post_ids))
+        with transaction.atomic():
+            # Writers block on the locked rows, so their votes are either counted below or applied on top
+            list(cls.objects.select_for_update().filter(post__in=posts).order_by("post_id").values_list("pk"))
+            post_ids = list(posts.values_list("pk", flat=True))
+            # Totals are aggregated and upserted by the database in one statement, so no vote leaves it.
+            # The versions of the dropped shards are folded in, so the version still moves forward.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {cls._meta.db_table} AS summary
+                        (id, created_at, updated_at, post_id, total_votes, score_sum, shards, version)
+                    SELECT
+                        gen_random_uuid(), now(), now(), post.id, count(vote.score), coalesce(sum(vote.score), 0), 0,
+                        1 + coalesce((
+                            SELECT sum(shard.version) FROM {PostSummaryShard._meta.db_table} shard
+                            WHERE shard.post_id = post.id
+                        ), 0)
+                    FROM {Post._meta.db_table} post
+                    LEFT JOIN (
+                        SELECT post_id, score FROM {Vote._meta.db_table} WHERE NOT reversed
+                        UNION ALL
+                        SELECT post_id, score FROM {VoteArchive._meta.db_table} WHERE NOT reversed
+                    ) vote ON vote.post_id = post.id
+                    WHERE post.id = ANY(%s)
+                    GROUP BY post.id
+                    ON CONFLICT (post_id) DO UPDATE SET
+                        total_votes = EXCLUDED.total_votes,
+                        score_sum = EXCLUDED.score_sum,
+                        shards = 0,
+                        version = summary.version + EXCLUDED.version,
+                        updated_at = EXCLUDED.updated_at
+                    """,
+                    [post_ids],
+                )
+            PostSummaryShard.objects.filter(post_id__in=post_ids).delete()
+            invalidate(POST_SUMMARY_KEY, post_ids)
+            forget(POST_SUMMARY_SHARDS_KEY, post_ids)
+        return len(post_ids)
+
+    @classmethod
+    def cached(cls, post_ids: Iterable) -> dict:
+        return get_many(POST_SUMMARY_KEY, post_ids, cls.load_many)
+
+    @classmethod
+    async def acached(cls, post_ids: Iterable) -> dict:
+        return await aget_many(POST_SUMMARY_KEY, post_ids, cls.aload_many)
+
+    @classmethod
+    def load_many(cls, post_ids: Iterable) -> dict:
+        summaries = {post_id: {"total_votes": 0, "average_score": Decimal(0), "version": 0} for post_id in post_ids}
+        for post_id, total_votes, score_sum, version in cls._totals(summaries):
+            summaries[post_id] = {
+                "total_votes": total_votes,
+                "average_score": cls.average(total_votes=total_votes, score_sum=score_sum),
+                "version": version,
+            }
+        return summaries
+
+    @classmethod
+    async def aload_many(cls, post_ids: Iterable) -> dict:
+        summaries = {post_id: {"total_votes": 0, "average_score": Decimal(0), "version": 0} for post_id in post_ids}
+        async for post_id, total_votes, score_sum, version in cls._totals(summaries):
+            summaries[post_id] = {
+                "total_votes": total_votes,
+                "average_score": cls.average(total_votes=total_votes, score_sum=score_sum),
+                "version": version,
+            }
+        return summaries
+
+    @classmethod
+    def _totals(cls, post_ids: Iterable) -> QuerySet:
+        return (
+            cls.objects
+            .filter(post_id__in=post_ids)
+            .values_list("post_id")
+            .annotate(
+                all_total_votes=F("total_votes") + Sum("post__summary_shards__total_votes", default=0),
+                all_score_sum=F("score_sum") + Sum("post__summary_shards__score_sum", default=0),
+                all_version=F("version") + Sum("post__summary_shards__version", default=0),
+            )
+            .values_list("post_id", "all_total_votes", "all_score_sum", "all_version")
+        )
+
+
+class PostSummaryShard(BaseModel):
+    post = models.ForeignKey(
+        Post, verbose_name="Post",
+        on_delete=models.CASCADE, related_name="summary_shards",
+    )
+    index = models.PositiveSmallIntegerField(
+        verbose_name="Index",
+    )
+    total_votes = models.BigIntegerField(
+        verbose_name="Total Votes",
+        default=0,
+    )
+    score_sum = models.BigIntegerField(
+        verbose_name="Score Sum",
+        default=0,
+    )
+    version = models.PositiveBigIntegerField(
+        verbose_name="Version",
+        default=0,
+    )
+
+    def __str__(self):
+        return f"Post: {self.post}, Shard: {self.index}, Total Votes: {self.total_votes}"
+
+    class Meta:
+        unique_together = ("post", "index",)
+
+
+class ScoreBucket(BaseModel):
+    post = models.ForeignKey(
+        Post, verbose_name="Post",
+        on_delete=models.CASCADE, related_name="score_buckets",
+    )
+    started_at = models.DateTimeField(
+        verbose_name="Started at",
+    )
+    shard = models.PositiveSmallIntegerField(
+        verbose_name="Shard",
+        help_text="Rows of a hot post share its writes like the summary shards, 0 when the post is not sharded",
+        default=0,
+    )
+    count = models.BigIntegerField(
+        verbose_name="Count",
+        default=0,
+    )
+    score_sum = models.BigIntegerField(
+        verbose_name="Score Sum",
+        default=0,
+    )
+    score_squares_sum = models.BigIntegerField(
+        verbose_name="Score Squares Sum",
+        default=0,
+    )
+    score_0_count = models.BigIntegerField(
+        verbose_name="Score 0 Count",
+        default=0,
+    )
+    score_1_count = models.BigIntegerField(
+        verbose_name="Score 1 Count",
+        default=0,
+    )
+    score_2_count = models.BigIntegerField(
+        verbose_name="Score 2 Count",
+        default=0,
+    )
+    score_3_count = models.BigIntegerField(
+        verbose_name="Score 3 Count",
+        default=0,
+    )
+    score_4_count = models.BigIntegerField(
+        verbose_name="Score 4 Count",
+        default=0,
+    )
+    score_5_count = models.BigIntegerField(
+        verbose_name="Score 5 Count",
+        default=0,
+    )
 
-        if old_score is None:
-            post_summary.average_score = (
-                (post_summary.average_score * post_summary.total_votes + new_score) /
-                (post_summary.total_votes + new_votes)
+    HISTOGRAM_FIELDS = [f"score_{score}_count" for score in SCORES]
+
+    def __str__(self):
+        return f"Post: {self.post}, Started at: {self.started_at}, Count: {self.count}"
+
+    @staticmethod
+    def bucket_start(moment: datetime) -> datetime:
+        size = settings.SCORE_BUCKET_SIZE.total_seconds()
+        timestamp = moment.timestamp()
+        return datetime.fromtimestamp(timestamp - timestamp % size, tz=dt_timezone.utc)
+
+    @classmethod
+    def record(cls, post_id, created_at: datetime, score: int, votes: int = 1):
+        cls.record_many([(post_id, created_at, score, votes)])
+
+    @classmethod
+    def record_many(cls, changes: Iterable[tuple[Any, datetime, int, int]]):
+        oldest = cls.bucket_start(timezone.now() - settings.FRAUD_DETECTION_BASELINE_WINDOW)
+        deltas = defaultdict(lambda: defaultdict(int))
+        shards = {}
+
+        for post_id, created_at, score, votes in changes:
+            started_at = cls.bucket_start(created_at)
+            if started_at < oldest:
+                continue
+            # The writes of a hot post are spread over as many rows as its summary shards, so its voters don't queue
+            if post_id not in shards:
+                shard_count = PostSummary.shard_count(post_id)
+                shards[post_id] = random.randrange(shard_count) if shard_count else 0
+            key = (post_id, started_at, shards[post_id])
+            deltas[key]["count"] += votes
+            deltas[key]["score_sum"] += votes * score
+            deltas[key]["score_squares_sum"] += votes * score * score
+            deltas[key][cls.HISTOGRAM_FIELDS[score]] += votes
+
+        # Only the buckets of the voted posts are locked, so votes on different posts never wait on each other
+        for (post_id, started_at, shard), delta in sorted(
+                deltas.items(), key=lambda item: (str(item[0][0]), item[0][1], item[0][2]),
+        ):
+            values = {field: F(field) + value for field, value in delta.items() if value}
+            if not values:
+                continue
+            buckets = cls.objects.filter(post_id=post_id, started_at=started_at, shard=shard)
+            if not buckets.update(**values):
+                cls.objects.get_or_create(post_id=post_id, started_at=started_at, shard=shard)
+                buckets.update(**values)
+
+    @classmethod
+    def statistics(cls, since: datetime, post: Post = None) -> ScoreStatistics:
+        buckets = cls.objects.filter(started_at__gte=cls.bucket_start(since))
+        if post is not None:
+            buckets = buckets.filter(post=post)
+        aggregates = (
+            buckets
+            .aggregate(
+                count=models.Sum("count"),
+                score_sum=models.Sum("score_sum"),
+                score_squares_sum=models.Sum("score_squares_sum"),
             )
-            post_summary.total_votes += new_votes
+        )
+        return ScoreStatistics.from_sums(
+            count=aggregates["count"] or 0,
+            score_sum=aggregates["score_sum"] or 0,
+            score_squares_sum=aggregates["score_squares_sum"] or 0,
+        )
+
+    @classmethod
+    def sums_by_post(cls, since: datetime) -> QuerySet:
+        return (
+            cls.objects
+            .filter(started_at__gte=cls.bucket_start(since))
+            .values("post", "post__tags")
+            .annotate(**{f"total_{field}": Sum(field) for field in cls.HISTOGRAM_FIELDS})
+            .order_by()
+        )
+
+    @classmethod
+    def rebuild(cls, votes: str = None, now: datetime = None) -> int:
+        # Only the buckets the given votes (post_id, created_at) fall in are recounted, or every bucket
+        # of the window when no votes are given, so the cost follows the change rather than the history
+        now = now or timezone.now()
+        size = settings.SCORE_BUCKET_SIZE.total_seconds()
+        touched = f"""
+            SELECT post_id, to_timestamp(floor(extract(epoch from created_at) / %s) * %s) AS started_at
+            FROM ({votes or f"SELECT post_id, created_at FROM {Vote._meta.db_table}"}) vote
+        """
+        if votes is None:
+            touched += f"UNION SELECT post_id, started_at FROM {cls._meta.db_table}"
+        histograms = ", ".join(
+            f"count(vote.score) FILTER (WHERE vote.score = {score}) AS {field}"
+            for score, field in zip(SCORES, cls.HISTOGRAM_FIELDS)
+        )
+        # The other shards of a bucket are zeroed rather than deleted, so writers blocked on them add on top
+        fields = ", ".join(
+            f"{field} = CASE WHEN bucket.shard = 0 THEN totals.{field} ELSE 0 END"
+            for field in ["count", "score_sum", "score_squares_sum", *cls.HISTOGRAM_FIELDS]
+        )
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT post_id, started_at FROM ({touched}) touched WHERE started_at >= %s",
+                [size, size, cls.bucket_start(now - settings.FRAUD_DETECTION_BASELINE_WINDOW)],
+            )
+            buckets = cursor.fetchall()
+            if not buckets:
+                return 0
+            keys = [[post_id for post_id, _ in buckets], [started_at for _, started_at in buckets]]
+
+            # Every bucket gets a row to lock, and the rows are locked in the order the vote path locks them.
+            # Writers that counted a vote before wait for the lock and are seen by the recount below,
+            # later ones wait on the lock and add their vote on top of it.
+            cursor.execute(
+                f"""
+                INSERT INTO {cls._meta.db_table} (id, created_at, updated_at, post_id, started_at, shard,
+                    count, score_sum, score_squares_sum, {", ".join(cls.HISTOGRAM_FIELDS)})
+                SELECT gen_random_uuid(), now(), now(), post_id, started_at, 0, 0, 0, 0, {", ".join("0" for _ in SCORES)}
+                FROM unnest(%s::uuid[], %s::timestamptz[]) AS touched(post_id, started_at)
+                ON CONFLICT (post_id, started_at, shard) DO NOTHING
+                """,
+                keys,
+            )
+            cursor.execute(
+                f"""
+                SELECT id FROM {cls._meta.db_table}
+                WHERE (post_id, started_at) IN (SELECT * FROM unnest(%s::uuid[], %s::timestamptz[]))
+                ORDER BY post_id, started_at, shard
+                FOR UPDATE
+                """,
+                keys,
+            )
+            cursor.execute(
+                f"""
+                WITH totals AS (
+                    SELECT
+                        touched.post_id, touched.started_at, count(vote.score) AS count,
+                        coalesce(sum(vote.score), 0) AS score_sum,
+                        coalesce(sum(vote.score * vote.score), 0) AS score_squares_sum,
+                        {histograms}
+                    FROM unnest(%s::uuid[], %s::timestamptz[]) AS touched(post_id, started_at)
+                    LEFT JOIN {Vote._meta.db_table} vote
+                    ON vote.post_id = touched.post_id AND NOT vote.reversed
+                    AND vote.created_at >= touched.started_at AND vote.created_at < touched.started_at + %s
+                    GROUP BY touched.post_id, touched.started_at
+                )
+                UPDATE {cls._meta.db_table} bucket SET {fields}, updated_at = now()
+                FROM totals
+                WHERE bucket.post_id = totals.post_id AND bucket.started_at = totals.started_at
+                """,
+                [*keys, settings.SCORE_BUCKET_SIZE],
+            )
+        return len(buckets)
+
+    @classmethod
+    def prune(cls, now: datetime = None) -> int:
+        now = now or timezone.now()
+        expired, _ = (
+            cls.objects
+            .filter(started_at__lt=cls.bucket_start(now - settings.FRAUD_DETECTION_BASELINE_WINDOW))
+            .delete()
+        )
+        return expired
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "started_at", "shard"],
+                name="unique_score_bucket",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["started_at"],
+                name="score_bucket_started_idx",
+            ),
+        ]
+
+
+class PostScoreTrend(BaseModel):
+    post = models.OneToOneField(
+        Post, verbose_name="Post",
+        on_delete=models.CASCADE, related_name="score_trend",
+    )
+    votes = models.BigIntegerField(
+        verbose_name="Votes",
+        default=0,
+    )
+    mean = models.FloatField(
+        verbose_name="Mean",
+        default=0.0,
+    )
+    variance = models.FloatField(
+        verbose_name="Variance",
+        default=0.0,
+    )
+    updated_until = models.DateTimeField(
+        verbose_name="Updated until",
+        help_text="Creation time of the latest vote folded into the moving averages",
+        null=True, blank=True,
+    )
+
+    def __str__(self):
+        return f"Post: {self.post}, Mean: {self.mean:.3f}, Votes: {self.votes}"
+
+    @property
+    def statistics(self) -> ScoreStatistics:
+        return ScoreStatistics(count=self.votes, mean=self.mean, variance=self.variance)
+
+    def fold(self, score: int, created_at: datetime, alpha: float):
+        if self.votes == 0:
+            self.mean = float(score)
+            self.variance = 0.0
         else:
-            post_summary.average_score = (
-                (post_summary.average_score * post_summary.total_votes - old_score + new_score) /
-                post_summary.total_votes
+            difference = score - self.mean
+            increment = alpha * difference
+            self.mean += increment
+            self.variance = (1 - alpha) * (self.variance + difference * increment)
+        self.votes += 1
+        self.updated_until = created_at
+
+
+class DetectionCheckpoint(BaseModel):
+    name = models.CharField(
+        verbose_name="Name",
+        max_length=100, unique=True,
+    )
+    processed_until = models.DateTimeField(
+        verbose_name="Processed until",
+        help_text="High-water mark of the vote creation times that have already been scored",
+        null=True, blank=True,
+    )
+
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
+
+    def advance(self, processed_until: datetime):
+        if self.processed_until is None or processed_until > self.processed_until:
+            self.processed_until = processed_until
+            self.save(update_fields=["processed_until", "updated_at"])
+
+    @staticmethod
+    def record_votes(count: int = 1):
+        if not settings.FRAUD_DETECTION_TRIGGER_VOTES:
+            return
+
+        votes = increment(FRAUD_DETECTION_VOTES_KEY, delta=count)
+        if votes >= settings.FRAUD_DETECTION_TRIGGER_VOTES and cache.delete(FRAUD_DETECTION_VOTES_KEY):
+            from app.tasks import fraud_detection
+            transaction.on_commit(fraud_detection.delay)
+
+
+class DailyScoreHistogram(BaseModel):
+    post = models.ForeignKey(
+        Post, verbose_name="Post",
+        on_delete=models.CASCADE, related_name="daily_score_histograms",
+    )
+    day = models.DateField(
+        verbose_name="Day",
+    )
+    score_0_count = models.BigIntegerField(
+        verbose_name="Score 0 Count",
+        default=0,
+    )
+    score_1_count = models.BigIntegerField(
+        verbose_name="Score 1 Count",
+        default=0,
+    )
+    score_2_count = models.BigIntegerField(
+        verbose_name="Score 2 Count",
+        default=0,
+    )
+    score_3_count = models.BigIntegerField(
+        verbose_name="Score 3 Count",
+        default=0,
+    )
+    score_4_count = models.BigIntegerField(
+        verbose_name="Score 4 Count",
+        default=0,
+    )
+    score_5_count = models.BigIntegerField(
+        verbose_name="Score 5 Count",
+        default=0,
+    )
+
+    HISTOGRAM_FIELDS = [f"score_{score}_count" for score in SCORES]
+
+    def __str__(self):
+        return f"Post: {self.post}, Day: {self.day}"
+
+    @classmethod
+    def counts_sql(cls, source: str) -> str:
+        return ", ".join(
+            f"count(*) FILTER (WHERE {source}.score = {score}) AS {field}"
+            for score, field in zip(SCORES, cls.HISTOGRAM_FIELDS)
+        )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "day"],
+                name="unique_daily_score_histogram",
+            ),
+        ]
+
+
+class VoteArchive(models.Model):
+    # Compacted votes past the retention age, kept for the (user, post) uniqueness and
+    # for score changes; the id, timestamps and exact creation time of a Vote are dropped
+    user = models.ForeignKey(
+        User, verbose_name="User",
+        on_delete=models.CASCADE, related_name="archived_votes",
+        # The unique constraint on (user, post) serves the lookups by user
+        db_index=False,
+    )
+    post = models.ForeignKey(
+        Post, verbose_name="Post",
+        on_delete=models.CASCADE, related_name="archived_votes",
+    )
+    score = models.PositiveSmallIntegerField(
+        verbose_name="Vote Score",
+    )
+    reversed = models.BooleanField(
+        verbose_name="Reversed",
+        default=False,
+    )
+    day = models.DateField(
+        verbose_name="Day",
+        help_text="Day the vote was cast on, which holds it in the daily histograms",
+    )
+
+    def __str__(self):
+        return f"{self.user_id} on {self.post_id}: {self.score}"
+
+    @classmethod
+    def restore(cls, ballots: Iterable[tuple[Any, Any]]) -> list[Vote]:
+        ballots = list(ballots)
+        if not ballots:
+            return []
+
+        ballots_sql = "SELECT unnest(%s::uuid[]) AS user_id, unnest(%s::uuid[]) AS post_id"
+        params = [[user_id for user_id, _ in ballots], [post_id for _, post_id in ballots]]
+        with connection.cursor() as cursor:
+            # Votes are almost always new, so the writing statement only runs once an index probe finds an archived one
+            cursor.execute(
+                f"""
+                SELECT EXISTS (
+                    SELECT 1 FROM {cls._meta.db_table} archive
+                    JOIN ({ballots_sql}) ballot ON archive.user_id = ballot.user_id AND archive.post_id = ballot.post_id
+                )
+                """,
+                params,
             )
+            if not cursor.fetchone()[0]:
+                return []
 
-        post_summary.save(update_fields=["total_votes", "average_score"])
-        return post_summary
+            cursor.execute(
+                cls.restore_sql(ballots_sql, "SELECT id, user_id, post_id, score, reversed, created_at FROM restored"),
+                params,
+            )
+            return [
+                Vote(pk=pk, user_id=user_id, post_id=post_id, score=score, reversed=reversed, created_at=created_at)
+                for pk, user_id, post_id, score, reversed, created_at in cursor.fetchall()
+            ]
+
+    @classmethod
+    def restore_sql(cls, ballots: str, result: str) -> str:
+        # Archived votes named by the ballots are moved back into the votes table and out of
+        # the daily histograms in one statement, so that they can be changed like any other
+        decrements = ", ".join(
+            f"{field} = histogram.{field} - removed.{field}" for field in DailyScoreHistogram.HISTOGRAM_FIELDS
+        )
+        return f"""
+            WITH archived AS (
+                DELETE FROM {cls._meta.db_table} archive
+                USING ({ballots}) ballot
+                WHERE archive.user_id = ballot.user_id AND archive.post_id = ballot.post_id
+                RETURNING archive.user_id, archive.post_id, archive.score, archive.reversed, archive.day
+            ),
+            restored AS (
+                INSERT INTO {Vote._meta.db_table} (id, created_at, updated_at, user_id, post_id, score, reversed)
+                SELECT gen_random_uuid(), day::timestamp AT TIME ZONE 'UTC', now(), user_id, post_id, score, reversed
+                FROM archived
+                RETURNING id, user_id, post_id, score, reversed, created_at
+            ),
+            histograms AS (
+                UPDATE {DailyScoreHistogram._meta.db_table} histogram
+                SET {decrements}, updated_at = now()
+                FROM (
+                    SELECT post_id, day, {DailyScoreHistogram.counts_sql("archived")}
+                    FROM archived WHERE NOT reversed GROUP BY post_id, day
+                ) removed
+                WHERE histogram.post_id = removed.post_id AND histogram.day = removed.day
+            )
+            {result}
+        """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"],
+                name="unique_archived_vote",
+            ),
+        ]
@@ -0,0 +1,211 @@
+import numpy as np
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from django.conf import settings
+from typing import Optional
+
+from app.detection import Baselines
+from app.detectors import Detector
+from app.models import Post, ScoreBucket, Vote
+from app.scoring import BACKENDS, CHUNK_SIZE, Candidates
+from app.statistics import SCORES, ScoreHistogram
+
+
+@dataclass
+class ReplayReport:
+    since: datetime
+    until: datetime
+    votes: int = 0
+    labelled: int = 0
+    flagged: int = 0
+    true_positives: int = 0
+    runs: int = 0
+    cpu_seconds: float = 0.0
+    detections: Counter = field(default_factory=Counter)
+
+    @property
+    def precision(self) -> float:
+        return self.true_positives / self.flagged if self.flagged else 0.0
+
+    @property
+    def recall(self) -> float:
+        return self.true_positives / self.labelled if self.labelled else 0.0
+
+    @property
+    def reversals_per_hour(self) -> float:
+        hours = (self.until - self.since).total_seconds() / 3600
+        return self.flagged / hours if hours else 0.0
+
+    @property
+    def cpu_seconds_per_million_votes(self) -> float:
+        return self.cpu_seconds / self.votes * 10 ** 6 if self.votes else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "votes": self.votes,
+            "runs": self.runs,
+            "labelled": self.labelled,
+            "flagged": self.flagged,
+            "detections": dict(self.detections),
+            "precision": self.precision,
+            "recall": self.recall,
+            "reversals_per_hour": self.reversals_per_hour,
+            "cpu_seconds_per_million_votes": self.cpu_seconds_per_million_votes,
+        }
+
+
+class SlidingHistograms:
+    # In-memory stand-in for the score buckets: per-post histograms of the votes inside the
+    # baseline window, with running totals per post and tag so that a run only reads its own posts
+
+    def __init__(self, window: timedelta):
+        self.window = window
+        self.buckets = {}
+        self.overall = np.zeros(len(SCORES), dtype=np.int64)
+        self.posts = {}
+        self.tags = defaultdict(lambda: np.zeros(len(SCORES), dtype=np.int64))
+        self.post_tags = {}
+
+    def add(self, post_id, created_at: datetime, score: int, delta: int = 1):
+        started_at = ScoreBucket.bucket_start(created_at)
+        bucket = self.buckets.setdefault(started_at, defaultdict(lambda: np.zeros(len(SCORES), dtype=np.int64)))
+        bucket[post_id][score] += delta
+        self.apply(post_id, score, delta)
+
+    def apply(self, post_id, score, delta):
+        self.overall[score] += delta
+        self.posts.setdefault(post_id, np.zeros(len(SCORES), dtype=np.int64))[score] += delta
+        for tag in self.post_tags.get(post_id, []):
+            self.tags[tag][score] += delta
+
+    def evict(self, now: datetime):
+        cutoff = ScoreBucket.bucket_start(now - self.window)
+        # Buckets are created in time order, so the expired ones are at the front
+        for started_at in list(self.buckets):
+            if started_at >= cutoff:
+                break
+            for post_id, counts in self.buckets.pop(started_at).items():
+                self.overall -= counts
+                self.posts[post_id] -= counts
+                for tag in self.post_tags.get(post_id, []):
+                    self.tags[tag] -= counts
+                if not self.posts[post_id].any():
+                    del self.posts[post_id]
+
+    def load_tags(self, post_ids):
+        missing = [post_id for post_id in post_ids if post_id not in self.post_tags]
+        for post_id, tags in Post.objects.filter(pk__in=missing).values_list("pk", "tags").iterator():
+            self.post_tags[post_id] = tags or []
+
+    def baselines(self, post_ids: list) -> Baselines:
+        zeros = np.zeros(len(SCORES), dtype=np.int64)
+        tags = {tag for post_id in post_ids for tag in self.post_tags.get(post_id, [])}
+        return Baselines(
+            overall=histogram(self.overall),
+            posts={post_id: histogram(self.posts.get(post_id, zeros)) for post_id in post_ids},
+            tags={tag: histogram(self.tags[tag]) for tag in tags},
+            post_tags={post_id: self.post_tags.get(post_id, []) for post_id in post_ids},
+        )
+
+
+def histogram(counts: np.ndarray) -> ScoreHistogram:
+    return ScoreHistogram(tuple(counts.tolist()))
+
+
+def replay(
+        since: datetime,
+        until: datetime,
+        detectors: list[Detector],
+        labels: Optional[set] = None,
+        interval: timedelta = timedelta(minutes=1),
+        baseline_window: Optional[timedelta] = None,
+        backend: Optional[str] = None,
+) -> ReplayReport:
+    # Votes are streamed in creation order and detection runs every interval of simulated time,
+    # so memory is bounded by the posts and the votes of one interval rather than by the stream.
+    # Without labels, the votes that were reversed at the time count as the fraudulent ones.
+    baseline_window = baseline_window or settings.FRAUD_DETECTION_BASELINE_WINDOW
+    standardize = BACKENDS[backend or settings.FRAUD_DETECTION_BACKEND]
+    report = ReplayReport(since=since, until=until)
+    histograms = SlidingHistograms(window=baseline_window)
+    for detector in detectors:
+        detector.persistent = False
+
+    def run(rows: list, now: datetime):
+        histograms.load_tags({post_id for _, post_id, *_ in rows})
+        for _, post_id, score, created_at, _ in rows:
+            histograms.add(post_id, created_at, score)
+        histograms.evict(now)
+
+        started = time.process_time()
+        candidates = Candidates.from_rows(row[:4] for row in rows)
+        flagged = np.zeros(len(candidates), dtype=bool)
+        if rows:
+            baselines = histograms.baselines(candidates.post_ids)
+            for detector in detectors:
+                post_baselines = detector.baselines(candidates, baselines)
+                z_scores = standardize(candidates, [statistics for _, statistics in post_baselines])
+                detections = np.abs(z_scores) >= detector.threshold
+                report.detections[detector.name] += int(detections.sum())
+                flagged |= detections
+            for detector in detectors:
+                detector.update(candidates, flagged)
+        report.cpu_seconds += time.process_time() - started
+        report.runs += 1
+
+        for (pk, post_id, score, created_at, was_reversed), is_flagged in zip(rows, flagged):
+            is_fraudulent = pk in labels if labels is not None else was_reversed
+            report.labelled += is_fraudulent
+            if is_flagged:
+                # The reversal takes the vote out of the baselines of later runs
+                histograms.add(post_id, created_at, score, delta=-1)
+                report.flagged += 1
+                report.true_positives += is_fraudulent
+        report.votes += len(rows)
+
+    votes = (
+        Vote.objects
+        .filter(created_at__gte=since - baseline_window, created_at__lt=until)
+        .order_by("created_at")
+        .values_list("pk", "post_id", "score", "created_at", "reversed")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    def warm_up(rows: list):
+        candidates = Candidates.from_rows(row[:4] for row in rows)
+        for detector in detectors:
+            detector.update(candidates, np.zeros(len(candidates), dtype=bool))
+
+    # Votes before the replay only warm the baselines and detector state up, as they stood at the time
+    rows, warm_up_rows = [], []
+    run_until = since + interval
+    for row in votes:
+        _, post_id, score, created_at, was_reversed = row
+        if created_at < since:
+            if not was_reversed:
+                histograms.load_tags([post_id])
+                histograms.add(post_id, created_at, score)
+                warm_up_rows.append(row)
+            if len(warm_up_rows) >= CHUNK_SIZE:
+                warm_up(warm_up_rows)
+                warm_up_rows = []
+            continue
+
+        if warm_up_rows:
+            warm_up(warm_up_rows)
+            warm_up_rows = []
+        while created_at >= run_until:
+            run(rows, run_until)
+            rows = []
+            run_until += interval
+        rows.append(row)
+
+    if warm_up_rows:
+        warm_up(warm_up_rows)
+    while run_until < until + interval:
+        run(rows, min(run_until, until))
+        rows = []
+        run_until += interval
+
+    return report
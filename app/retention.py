@@ -0,0 +1,99 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from typing import Optional
+
+from app.cache import acquire_lock, release_lock
+from app.models import DailyScoreHistogram, Vote, VoteArchive
+
+RETENTION = "vote_retention"
+
+
+@dataclass
+class CompactionReport:
+    cutoff: Optional[datetime] = None
+    skipped: bool = False
+    votes: int = 0
+    chunks: int = 0
+    complete: bool = False
+
+
+def retention_cutoff(now: datetime) -> Optional[datetime]:
+    if settings.VOTE_RETENTION_AGE is None:
+        return None
+    # Fraud detection reads every vote of the baseline window, so those are never compacted
+    return now - max(settings.VOTE_RETENTION_AGE, settings.FRAUD_DETECTION_BASELINE_WINDOW)
+
+
+def compact_chunk(cutoff: datetime, chunk_size: int) -> int:
+    # One short transaction moves a chunk of expired votes into the archive and the daily
+    # histograms; rows locked by writers are skipped and picked up by a later chunk
+    fields = ", ".join(DailyScoreHistogram.HISTOGRAM_FIELDS)
+    increments = ", ".join(
+        f"{field} = histogram.{field} + EXCLUDED.{field}" for field in DailyScoreHistogram.HISTOGRAM_FIELDS
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH expired AS (
+                DELETE FROM {Vote._meta.db_table} WHERE id IN (
+                    SELECT id FROM {Vote._meta.db_table}
+                    WHERE created_at < %s
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING user_id, post_id, score, reversed, (created_at AT TIME ZONE 'UTC')::date AS day
+            ),
+            archived AS (
+                INSERT INTO {VoteArchive._meta.db_table} (user_id, post_id, score, reversed, day)
+                SELECT user_id, post_id, score, reversed, day FROM expired
+            ),
+            histograms AS (
+                INSERT INTO {DailyScoreHistogram._meta.db_table} AS histogram
+                    (id, created_at, updated_at, post_id, day, {fields})
+                SELECT gen_random_uuid(), now(), now(), post_id, day, {DailyScoreHistogram.counts_sql("expired")}
+                FROM expired WHERE NOT reversed GROUP BY post_id, day
+                ON CONFLICT (post_id, day) DO UPDATE SET {increments}, updated_at = EXCLUDED.updated_at
+            )
+            SELECT count(*) FROM expired
+            """,
+            [cutoff, chunk_size],
+        )
+        return cursor.fetchone()[0]
+
+
+def compact_votes(
+        now: Optional[datetime] = None,
+        chunk_size: Optional[int] = None,
+        time_limit: Optional[float] = None,
+) -> CompactionReport:
+    now = now or timezone.now()
+    chunk_size = chunk_size or settings.VOTE_RETENTION_CHUNK_SIZE
+    time_limit = time_limit or settings.VOTE_RETENTION_TIME_LIMIT
+    report = CompactionReport(cutoff=retention_cutoff(now))
+    if report.cutoff is None:
+        return report
+
+    lock = acquire_lock(RETENTION, timeout=int(time_limit) * 2)
+    if lock is None:
+        report.skipped = True
+        return report
+
+    # Every chunk commits on its own, so a run cut short by the time limit or a crash
+    # leaves nothing half done and the next run carries on with the votes that remain
+    started = time.monotonic()
+    try:
+        while time.monotonic() - started < time_limit:
+            compacted = compact_chunk(report.cutoff, chunk_size)
+            report.votes += compacted
+            report.chunks += 1
+            if compacted < chunk_size:
+                report.complete = True
+                break
+    finally:
+        release_lock(RETENTION, lock)
+
+    return report
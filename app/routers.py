@@ -0,0 +1,85 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from typing import Any, Iterable, Optional
+
+REPLICA_LAG_KEY = "replica-lag:{}"
+REPLICA_PIN_KEY = "replica-pin:{}"
+
+# A replica that is not in recovery is a stand-in, e.g. in tests, and never lags
+REPLICATION_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp())::float8, 'Infinity'::float8)
+    END
+"""
+
+# Reads are only sent to the replica inside use_replica(), so anything not marked as lag tolerant stays on the primary
+read_alias: ContextVar[Optional[str]] = ContextVar("read_alias", default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints) -> str:
+        # Instances read from the replica would otherwise take their related lookups there as well
+        return read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints) -> str:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> Optional[bool]:
+        # The replica receives the schema through replication
+        return None if db == DEFAULT_DB_ALIAS else False
+
+
+def replication_lag(alias: str, cached: bool = True) -> float:
+    lag = cache.get(REPLICA_LAG_KEY.format(alias)) if cached else None
+    if lag is None:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(REPLICATION_LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError:
+            lag = float("inf")
+        cache.set(REPLICA_LAG_KEY.format(alias), lag, timeout=settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL)
+    return lag
+
+
+def pin_to_primary(user_ids: Iterable[Any]):
+    # Until the replica has certainly caught up, the voters read their writes from the primary
+    if settings.DATABASE_REPLICA is None:
+        return
+    timeout = settings.DATABASE_REPLICA_MAX_LAG + settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL
+    cache.set_many({REPLICA_PIN_KEY.format(user_id): True for user_id in user_ids}, timeout=timeout)
+
+
+def replica_for(user_id: Any = None, max_lag: Optional[float] = None, cached: bool = True) -> Optional[str]:
+    alias = settings.DATABASE_REPLICA
+    if alias is None:
+        return None
+    if user_id is not None and cache.get(REPLICA_PIN_KEY.format(user_id)):
+        return None
+    if replication_lag(alias, cached) > (settings.DATABASE_REPLICA_MAX_LAG if max_lag is None else max_lag):
+        return None
+    return alias
+
+
+@contextmanager
+def reading_from(alias: Optional[str]):
+    token = read_alias.set(alias)
+    try:
+        yield
+    finally:
+        read_alias.reset(token)
+
+
+def use_replica(user_id: Any = None, max_lag: Optional[float] = None):
+    return reading_from(replica_for(user_id, max_lag))
+
+
+def use_primary():
+    return reading_from(None)
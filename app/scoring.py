@@ -0,0 +1,64 @@
+import numpy as np
+from dataclasses import dataclass, field
+from django.db.models import QuerySet
+from typing import Iterable
+
+CHUNK_SIZE = 10000
+
+
+# Rows are (pk, post_id, score, created_at) tuples, read into one column each
+ROW_DTYPE = np.dtype([("pk", object), ("post_id", object), ("score", np.float64), ("created_at", object)])
+
+
+@dataclass
+class Candidates:
+    pks: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=object))
+    post_ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=object))
+    groups: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    scores: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float64))
+    created_at: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=object))
+
+    @classmethod
+    def load(cls, votes: QuerySet) -> "Candidates":
+        return cls.from_rows(votes.values_list("pk", "post_id", "score", "created_at").iterator(chunk_size=CHUNK_SIZE))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> "Candidates":
+        columns = np.fromiter(rows, dtype=ROW_DTYPE)
+        # Each distinct post is resolved to its baselines once and the votes refer to it by position
+        post_ids, groups = np.unique(columns["post_id"], return_inverse=True)
+        return cls(
+            pks=columns["pk"],
+            post_ids=post_ids,
+            groups=groups.astype(np.int64),
+            scores=columns["score"],
+            created_at=columns["created_at"],
+        )
+
+    def __len__(self):
+        return len(self.pks)
+
+    def votes_per_post(self) -> np.ndarray:
+        return np.bincount(self.groups, minlength=len(self.post_ids))
+
+
+def standardize_python(candidates: Candidates, baselines: list) -> np.ndarray:
+    z_scores = (baselines[group].z_score(score) for group, score in zip(candidates.groups, candidates.scores))
+    return np.array([np.nan if z_score is None else z_score for z_score in z_scores], dtype=np.float64)
+
+
+def standardize_numpy(candidates: Candidates, baselines: list) -> np.ndarray:
+    counts = np.array([baseline.count for baseline in baselines], dtype=np.int64)[candidates.groups]
+    locations = np.array([baseline.location for baseline in baselines], dtype=np.float64)[candidates.groups]
+    scales = np.array([baseline.scale for baseline in baselines], dtype=np.float64)[candidates.groups]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_scores = np.where(scales > 0, (candidates.scores - locations) / scales, 0.0)
+    return np.where(counts > 0, z_scores, np.nan)
+
+
+# Both compute the same standardized deviations, "python" one vote at a time as a reference
+BACKENDS = {
+    "python": standardize_python,
+    "numpy": standardize_numpy,
+}
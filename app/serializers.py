@@ -1,8 +1,11 @@
 from decimal import Decimal
+from django.conf import settings
 from rest_framework import serializers
 from typing import Optional
 
+from app.ingestion import FAILED, PENDING
 from app.models import Post, PostSummary, Vote
+from utils.constants import VoteStatus
 
 
 class PostListSerializer(serializers.ModelSerializer):
@@ -21,12 +24,15 @@ class PostListSerializer(serializers.ModelSerializer):
         )
 
     def get_average_score(self, obj: Post) -> Decimal:
-        return obj.summary.average_score
+        return self._get_summary(obj)["average_score"]
 
     def get_score_count(self, obj: Post) -> int:
-        return obj.summary.total_votes
+        return self._get_summary(obj)["total_votes"]
 
     def get_user_score(self, obj: Post) -> Optional[int]:
+        if "user_scores" in self.context:
+            return self.context["user_scores"].get(obj.pk)
+
         user = self.context['request'].user
         try:
             vote = Vote.objects.get(user=user, post=obj)
@@ -34,6 +40,11 @@ class PostListSerializer(serializers.ModelSerializer):
             return None
         return vote.score
 
+    def _get_summary(self, obj: Post) -> dict:
+        if "summaries" in self.context:
+            return self.context["summaries"][obj.pk]
+        return PostSummary.cached([obj.pk])[obj.pk]
+
 
 class CastVoteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -48,3 +59,37 @@ class CastVoteSerializer(serializers.ModelSerializer):
             "post",
             "score",
         )
+
+
+class BallotSerializer(serializers.Serializer):
+    post = serializers.UUIDField()
+    score = serializers.IntegerField()
+
+
+class BulkCastVoteSerializer(serializers.Serializer):
+    votes = serializers.ListField(
+        child=BallotSerializer(),
+        allow_empty=False,
+        max_length=settings.VOTE_BATCH_MAX_SIZE,
+    )
+
+
+class BallotResultSerializer(serializers.Serializer):
+    post = serializers.CharField()
+    score = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=[vote_status.value for vote_status in VoteStatus])
+    error = serializers.CharField(required=False)
+
+
+class BulkCastVoteResultSerializer(serializers.Serializer):
+    results = BallotResultSerializer(many=True)
+
+
+class VoteStatusSerializer(serializers.Serializer):
+    token = serializers.UUIDField()
+    status = serializers.ChoiceField(choices=[PENDING, FAILED] + [vote_status.value for vote_status in VoteStatus])
+    error = serializers.CharField(required=False)
+
+
+class AuthTokenSerializer(serializers.Serializer):
+    token = serializers.CharField(read_only=True)
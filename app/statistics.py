@@ -0,0 +1,137 @@
+import math
+from dataclasses import dataclass
+from django.db import models
+from django.db.models import QuerySet
+from typing import Iterable, Optional
+
+SCORES = range(0, 6)
+
+# Scale the median absolute deviation, or the mean absolute deviation when more than half of
+# the votes share one score, to estimate the standard deviation of normally distributed scores
+MEDIAN_ABSOLUTE_DEVIATION_SCALE = 1.4826
+MEAN_ABSOLUTE_DEVIATION_SCALE = 1.2533
+
+
+@dataclass(frozen=True)
+class ScoreStatistics:
+    count: int = 0
+    mean: float = 0.0
+    variance: float = 0.0
+
+    @classmethod
+    def from_queryset(cls, votes: QuerySet) -> "ScoreStatistics":
+        aggregates = votes.order_by().aggregate(
+            count=models.Count("pk"),
+            mean=models.Avg("score"),
+            variance=models.Variance("score"),
+        )
+        if not aggregates["count"]:
+            return cls()
+
+        return cls(
+            count=aggregates["count"],
+            mean=float(aggregates["mean"]),
+            variance=float(aggregates["variance"]),
+        )
+
+    @classmethod
+    def from_sums(cls, count: int, score_sum: int, score_squares_sum: int) -> "ScoreStatistics":
+        if not count:
+            return cls()
+
+        return cls(
+            count=count,
+            mean=score_sum / count,
+            variance=(count * score_squares_sum - score_sum ** 2) / count ** 2,
+        )
+
+    @property
+    def standard_deviation(self) -> float:
+        return math.sqrt(max(self.variance, 0.0))
+
+    @property
+    def location(self) -> float:
+        return self.mean
+
+    @property
+    def scale(self) -> float:
+        return self.standard_deviation
+
+    def z_score(self, score: int) -> Optional[float]:
+        return standardize(self, score)
+
+
+@dataclass(frozen=True)
+class RobustStatistics:
+    count: int = 0
+    median: float = 0.0
+    scale: float = 0.0
+
+    @property
+    def location(self) -> float:
+        return self.median
+
+    def z_score(self, score: int) -> Optional[float]:
+        return standardize(self, score)
+
+
+@dataclass(frozen=True)
+class ScoreHistogram:
+    counts: tuple[int, ...] = (0,) * len(SCORES)
+
+    @classmethod
+    def merge(cls, histograms: Iterable["ScoreHistogram"]) -> "ScoreHistogram":
+        counts = [0] * len(SCORES)
+        for histogram in histograms:
+            for score, count in zip(SCORES, histogram.counts):
+                counts[score] += count
+        return cls(tuple(counts))
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    @property
+    def statistics(self) -> ScoreStatistics:
+        return ScoreStatistics.from_sums(
+            count=self.count,
+            score_sum=sum(score * count for score, count in zip(SCORES, self.counts)),
+            score_squares_sum=sum(score * score * count for score, count in zip(SCORES, self.counts)),
+        )
+
+    @property
+    def robust_statistics(self) -> RobustStatistics:
+        if not self.count:
+            return RobustStatistics()
+
+        median = weighted_median(zip(SCORES, self.counts))
+        deviations = sorted((abs(score - median), count) for score, count in zip(SCORES, self.counts))
+        scale = MEDIAN_ABSOLUTE_DEVIATION_SCALE * weighted_median(deviations)
+        if scale == 0:
+            mean_absolute_deviation = sum(deviation * count for deviation, count in deviations) / self.count
+            scale = MEAN_ABSOLUTE_DEVIATION_SCALE * mean_absolute_deviation
+
+        return RobustStatistics(count=self.count, median=median, scale=scale)
+
+
+def weighted_median(values: Iterable[tuple[float, int]]) -> float:
+    values = [(value, count) for value, count in values if count]
+    total = sum(count for _, count in values)
+
+    def nth(position: int) -> float:
+        for value, count in values:
+            if position < count:
+                return value
+            position -= count
+
+    return (nth((total - 1) // 2) + nth(total // 2)) / 2
+
+
+def standardize(statistics, score: int) -> Optional[float]:
+    if statistics.count == 0:
+        return None
+
+    if statistics.scale == 0:
+        return 0
+
+    return (score - statistics.location) / statistics.scale
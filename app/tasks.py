@@ -1,32 +1,126 @@
-from celery import shared_task
-from datetime import timedelta
+from celery import chord, shared_task
+from collections import Counter
+from datetime import datetime
 from django.conf import settings
 from django.utils import timezone
 
-from app.models import Vote
+from app import retention
+from app.cache import acquire_lock, release_lock
+from app.detection import CHECKPOINT, DetectionReport, advance_checkpoint, detect_fraud, detection_since, score_votes
+from app.ingestion import drain_votes
+from app.metrics import registry, timer
+from app.models import PostSummary, ScoreBucket, Vote
 
 
 @shared_task
 def fraud_detection():
+    shards = settings.FRAUD_DETECTION_SHARDS
+    if shards == 1:
+        with timer("fraud_detection_run"):
+            report = detect_fraud()
+            record_stages(report.timings)
+            return record_detection(report.summary())
+
     now = timezone.now()
-    last_30_minutes = now - timedelta(minutes=30)
-    last_24_hours = now - timedelta(hours=24)
+    lock = acquire_lock(CHECKPOINT, timeout=settings.FRAUD_DETECTION_LOCK_TIMEOUT)
+    if lock is None:
+        return record_detection(DetectionReport(now=now, skipped=True).summary())
 
-    votes_30_minutes_ago = (
-        Vote.objects
-        .filter(
-            created_at__gte=last_30_minutes,
+    # The lock spans the whole chord and is released by its callback, or by the error
+    # handler when a shard fails, so a run outlasting the beat interval is not overlapped
+    try:
+        since = detection_since(now)
+        result = chord(
+            detect_fraud_shard.s(now.isoformat(), since.isoformat(), shard, shards)
+            for shard in range(shards)
+        )(
+            merge_fraud_detection.s(now.isoformat(), lock).on_error(release_fraud_detection_lock.si(lock))
         )
-    )
+    except Exception:
+        release_lock(CHECKPOINT, lock)
+        raise
+    return {"skipped": False, "shards": shards, "chord": result.id}
 
-    real_votes_24_hours_ago = (
-        Vote.objects
-        .filter(
-            reversed=False,
-            created_at__gte=last_24_hours,
-        )
+
+@shared_task
+def detect_fraud_shard(now: str, since: str, shard: int, shards: int) -> dict:
+    report = score_votes(
+        now=datetime.fromisoformat(now),
+        since=datetime.fromisoformat(since),
+        shard=shard,
+        shards=shards,
     )
+    record_stages(report.timings)
+    return report.summary()
+
+
+@shared_task
+def merge_fraud_detection(summaries: list, now: str, lock: str) -> dict:
+    try:
+        advance_checkpoint(datetime.fromisoformat(now))
+    finally:
+        release_lock(CHECKPOINT, lock)
+
+    detections, timings = Counter(), Counter()
+    for summary in summaries:
+        detections.update(summary["detections"])
+        timings.update(summary["timings"])
+    registry.observe("fraud_detection_run_seconds", (timezone.now() - datetime.fromisoformat(now)).total_seconds())
+    return record_detection({
+        "skipped": False,
+        "candidates": sum(summary["candidates"] for summary in summaries),
+        "detections": dict(detections),
+        "reversed": sum(summary["reversed"] for summary in summaries),
+        "timings": dict(timings),
+        "shards": len(summaries),
+    })
+
+
+@shared_task
+def release_fraud_detection_lock(lock: str):
+    release_lock(CHECKPOINT, lock)
+
+
+def record_stages(timings: dict):
+    for stage, seconds in timings.items():
+        registry.observe("fraud_detection_stage_seconds", seconds, stage=stage)
+
 
-    for vote in votes_30_minutes_ago:
-        if abs(vote.z_score(recent_votes=real_votes_24_hours_ago)) >= settings.Z_SCORE_THRESHOLD:
-            vote.reverse()
+def record_detection(summary: dict) -> dict:
+    registry.inc("fraud_detection_runs_total", outcome="skipped" if summary["skipped"] else "completed")
+    registry.inc("fraud_detection_votes_scored_total", summary["candidates"])
+    registry.inc("fraud_detection_votes_reversed_total", summary["reversed"])
+    for detector, detections in summary["detections"].items():
+        registry.inc("fraud_detection_votes_flagged_total", detections, detector=detector)
+    return summary
+
+
+@shared_task
+def compact_votes():
+    with timer("vote_retention_run"):
+        report = retention.compact_votes()
+        registry.inc("vote_retention_votes_compacted_total", report.votes)
+    return {"skipped": report.skipped, "votes": report.votes, "chunks": report.chunks, "complete": report.complete}
+
+
+@shared_task
+def prune_score_buckets():
+    return ScoreBucket.prune()
+
+
+@shared_task
+def fold_post_summary_shards():
+    return PostSummary.fold_shards()
+
+
+@shared_task
+def drain_vote_queue():
+    with timer("vote_queue_drain"):
+        drained = drain_votes()
+        registry.inc("vote_queue_drained_total", drained)
+    return drained
+
+
+@shared_task
+def reverse_ballots(ballots: list):
+    return Vote.objects.for_ballots(ballots).bulk_reverse()["reversed"]
@@ -1,17 +1,49 @@
+from django.conf import settings
 from django.urls import re_path
+from django.views.decorators.csrf import csrf_exempt
 
-from app.views import PostListView, CastVoteView
+from app.views import (
+    PostListView,
+    CastVoteView,
+    BulkCastVoteView,
+    VoteStatusView,
+    AuthTokenView,
+    AsyncPostListView,
+    AsyncCastVoteView,
+)
+
+if settings.ASYNC_VIEWS:
+    post_list_view = AsyncPostListView.as_view()
+    cast_vote_view = csrf_exempt(AsyncCastVoteView.as_view())
+else:
+    post_list_view = PostListView.as_view()
+    cast_vote_view = CastVoteView.as_view()
 
 app_name = "app"
 urlpatterns = [
+    re_path(
+        r"auth/token/?$",
+        AuthTokenView.as_view(),
+        name="auth-token",
+    ),
     re_path(
         r"blog/posts/?$",
-        PostListView.as_view(),
+        post_list_view,
         name="post-list",
     ),
     re_path(
         r"blog/posts/(?P<post>[0-9a-fA-F-]{36})/vote/(?P<score>[0-9])/?$",
-        CastVoteView.as_view(),
+        cast_vote_view,
         name="cast-vote",
-    )
+    ),
+    re_path(
+        r"blog/votes/?$",
+        BulkCastVoteView.as_view(),
+        name="bulk-cast-vote",
+    ),
+    re_path(
+        r"blog/votes/(?P<token>[0-9a-fA-F-]{36})/?$",
+        VoteStatusView.as_view(),
+        name="vote-status",
+    ),
 ]
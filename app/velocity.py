@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from typing import Any, Iterable, Optional
+
+from app.cache import VOTE_VELOCITY_KEY, increment
+
+
+class VelocityExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many votes, retry in {retry_after:.0f} seconds.")
+        self.retry_after = retry_after
+
+
+def sliding_count(subject: str, window: timedelta, now: datetime, delta: int) -> tuple[float, float]:
+    # The sliding window is approximated by the current fixed window plus the share of
+    # the previous one that still overlaps it, which costs two counters per window
+    size = window.total_seconds()
+    index, elapsed = divmod(now.timestamp(), size)
+    current = increment(VOTE_VELOCITY_KEY.format(subject, int(size), int(index)), delta=delta, timeout=int(size * 2))
+    previous = cache.get(VOTE_VELOCITY_KEY.format(subject, int(size), int(index) - 1), 0)
+    return current + previous * (1 - elapsed / size), size - elapsed
+
+
+def uncount(subject: str, window: timedelta, now: datetime, delta: int):
+    size = window.total_seconds()
+    index = int(now.timestamp() // size)
+    increment(VOTE_VELOCITY_KEY.format(subject, int(size), index), delta=-delta, timeout=int(size * 2))
+
+
+def limit_velocity(user, post_ids: Iterable[Any], now: Optional[datetime] = None) -> bool:
+    post_ids = list(post_ids)
+    if not post_ids:
+        return False
+
+    now = now or timezone.now()
+    counted = []
+    retry_after = []
+
+    # A bulk request counts once, so a client replaying the votes it cast offline is not throttled by its batch size
+    for window, limit in settings.VOTE_VELOCITY_LIMITS:
+        count, remaining = sliding_count(f"user:{user.pk}", window, now, delta=1)
+        counted.append((f"user:{user.pk}", window))
+        if count > limit:
+            retry_after.append(remaining)
+
+    # Fresh accounts piling onto one post are limited together, as a cluster
+    if user.date_joined >= now - settings.VOTE_VELOCITY_NEW_ACCOUNT_AGE:
+        for post_id in set(post_ids):
+            for window, limit in settings.VOTE_VELOCITY_NEW_ACCOUNT_LIMITS:
+                count, remaining = sliding_count(f"new-accounts:{post_id}", window, now, delta=1)
+                counted.append((f"new-accounts:{post_id}", window))
+                if count > limit:
+                    retry_after.append(remaining)
+
+    if not retry_after:
+        return False
+    if settings.VOTE_VELOCITY_ACTION == "reject":
+        # Rejected votes are not counted, so a client retrying after Retry-After is not locked out by its retries
+        for subject, window in counted:
+            uncount(subject, window, now, delta=1)
+        raise VelocityExceeded(retry_after=max(retry_after))
+    return True
+
+
+def queue_reversal(ballots: Iterable[tuple[Any, Any]]):
+    from app.tasks import reverse_ballots
+
+    ballots = [(str(user_id), str(post_id)) for user_id, post_id in ballots]
+    transaction.on_commit(lambda: reverse_ballots.delay(ballots))
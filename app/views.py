@@ -1,21 +1,87 @@
+import hashlib
+import hmac
+import math
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
 from rest_framework import status
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import NotFound, Throttled, ValidationError
 from rest_framework.generics import ListAPIView, GenericAPIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
-from app.serializers import PostListSerializer, CastVoteSerializer
-from app.models import Post, Vote
+from app.serializers import (
+    AuthTokenSerializer,
+    PostListSerializer,
+    CastVoteSerializer,
+    BulkCastVoteSerializer,
+    BulkCastVoteResultSerializer,
+    VoteStatusSerializer,
+)
+from app.authentication import aauthenticate
+from app.cache import USER_VOTES_VERSION_KEY, aget_versions, get_versions
+from app.ingestion import PENDING, enqueue_vote, get_vote_status
+from app.metrics import registry
+from app.models import Post, PostSummary, Vote
+from app.routers import use_replica
+from app.velocity import VelocityExceeded, limit_velocity
 from utils.constants import Namespace
 from utils.models import ExtendedSchema
+from utils.pagination import CreatedAtCursorPagination
+
+
+def listing_etag(request, user_id, user_version: int, posts: list, summaries: dict, paginator) -> str:
+    # The versions pin down every byte of the page, so the tag is a strong one
+    state = [request.get_full_path(), str(user_id), str(user_version), str(paginator.has_next), str(paginator.has_previous)]
+    state.extend(f"{post.pk}:{post.updated_at.isoformat()}:{summaries[post.pk]['version']}" for post in posts)
+    return '"{}"'.format(hashlib.sha256("\n".join(state).encode()).hexdigest())
+
+
+def not_modified(request, etag: str):
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+    return response
 
 
 class PostListView(ExtendedSchema, ListAPIView):
     schema_tags = [Namespace.POST.value]
     serializer_class = PostListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     queryset = Post.objects.all()
     http_method_names = ["get"]
 
+    def get_queryset(self):
+        return super().get_queryset().only("pk", "title", "created_at", "updated_at")
+
+    def list(self, request, *args, **kwargs):
+        # The version is read ahead of the scores it stands for, so a vote in between costs a full response at most
+        user_version = get_versions(USER_VOTES_VERSION_KEY, [request.user.pk])[request.user.pk]
+        with use_replica(user_id=request.user.pk):
+            posts = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        summaries = PostSummary.cached(post.pk for post in posts)
+
+        etag = listing_etag(request, request.user.pk, user_version, posts, summaries, self.paginator)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        context = self.get_serializer_context()
+        context["summaries"] = summaries
+        context["user_scores"] = Vote.objects.cached_user_scores(request.user.pk)
+
+        serializer = self.get_serializer_class()(posts, many=True, context=context)
+        response = self.get_paginated_response(serializer.data)
+        response["ETag"] = etag
+        return response
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
@@ -24,6 +90,7 @@ class PostListView(ExtendedSchema, ListAPIView):
 
 class CastVoteView(ExtendedSchema, GenericAPIView):
     schema_tags = [Namespace.USER.value]
+    schema_responses = {200: CastVoteSerializer, 202: VoteStatusSerializer}
     serializer_class = CastVoteSerializer
     permission_classes = [IsAuthenticated]
     queryset = Vote.objects.all()
@@ -36,10 +103,176 @@ class CastVoteView(ExtendedSchema, GenericAPIView):
 
     def post(self, request, *args, **kwargs):
         user = self.request.user
+        if settings.VOTE_INGESTION_ASYNC:
+            return self.enqueue(user, post_id=kwargs.get("post"), score=int(kwargs.get("score")))
+
         post = Post.objects.get(pk=kwargs.get("post"))
         score = kwargs.get("score")
 
-        vote = user.vote(post=post, score=score)
+        try:
+            vote = user.vote(post=post, score=score)
+        except VelocityExceeded as exception:
+            raise Throttled(wait=exception.retry_after)
 
         serializer = self.get_serializer(instance=vote)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def enqueue(self, user, post_id, score: int):
+        if not 0 <= score <= 5:
+            raise ValidationError({"score": ["Ensure the score is an integer between 0 and 5."]})
+        if not Post.objects.filter(pk=post_id).exists():
+            raise NotFound("Post does not exist.")
+        try:
+            reverse = limit_velocity(user, [post_id])
+        except VelocityExceeded as exception:
+            raise Throttled(wait=exception.retry_after)
+
+        token = enqueue_vote(user_id=user.pk, post_id=post_id, score=score, reverse=reverse)
+
+        serializer = VoteStatusSerializer({"token": token, "status": PENDING})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+class BulkCastVoteView(ExtendedSchema, GenericAPIView):
+    schema_tags = [Namespace.USER.value]
+    schema_request = BulkCastVoteSerializer
+    schema_responses = BulkCastVoteResultSerializer
+    serializer_class = BulkCastVoteSerializer
+    permission_classes = [IsAuthenticated]
+    queryset = Vote.objects.all()
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            results = request.user.vote_many(
+                (ballot["post"], ballot["score"]) for ballot in serializer.validated_data["votes"]
+            )
+        except VelocityExceeded as exception:
+            raise Throttled(wait=exception.retry_after)
+
+        return Response(BulkCastVoteResultSerializer({"results": results}).data, status=status.HTTP_200_OK)
+
+
+class VoteStatusView(ExtendedSchema, GenericAPIView):
+    schema_tags = [Namespace.USER.value]
+    serializer_class = VoteStatusSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ["get"]
+
+    def get(self, request, *args, **kwargs):
+        vote_status = get_vote_status(token=kwargs.get("token"), user_id=request.user.pk)
+        if vote_status is None:
+            raise NotFound("Vote token is unknown or has expired.")
+
+        serializer = self.get_serializer({"token": kwargs.get("token"), **vote_status})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class AuthTokenView(ExtendedSchema, GenericAPIView):
+    schema_tags = [Namespace.USER.value]
+    serializer_class = AuthTokenSerializer
+    authentication_classes = [BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+    http_method_names = ["post", "delete"]
+
+    def post(self, request, *args, **kwargs):
+        token, created = Token.objects.get_or_create(user=request.user)
+
+        serializer = self.get_serializer({"token": token.key})
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        for token in Token.objects.filter(user=request.user):
+            token.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncPostListView(View):
+    async def get(self, request, *args, **kwargs):
+        credentials = await aauthenticate(request)
+        if credentials is None:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        user, _ = credentials
+
+        user_version = (await aget_versions(USER_VOTES_VERSION_KEY, [user.pk]))[user.pk]
+        paginator = CreatedAtCursorPagination()
+        drf_request = Request(request)
+        with use_replica(user_id=user.pk):
+            posts = await sync_to_async(paginator.paginate_queryset)(
+                Post.objects.only("pk", "title", "created_at", "updated_at"), drf_request,
+            )
+        summaries = await PostSummary.acached(post.pk for post in posts)
+
+        etag = listing_etag(request, user.pk, user_version, posts, summaries, paginator)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        context = {
+            "request": drf_request,
+            "summaries": summaries,
+            "user_scores": await Vote.objects.acached_user_scores(user.pk),
+        }
+        serializer = PostListSerializer(posts, many=True, context=context)
+        response = JsonResponse(
+            {
+                "next": paginator.get_next_link(),
+                "previous": paginator.get_previous_link(),
+                "results": serializer.data,
+            },
+            encoder=JSONEncoder,
+        )
+        response["ETag"] = etag
+        return response
+
+
+class AsyncCastVoteView(View):
+    async def post(self, request, *args, **kwargs):
+        credentials = await aauthenticate(request)
+        if credentials is None:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        user, _ = credentials
+
+        post = await Post.objects.filter(pk=kwargs.get("post")).afirst()
+        if post is None:
+            return JsonResponse({"detail": "Post does not exist."}, status=status.HTTP_404_NOT_FOUND)
+        score = int(kwargs.get("score"))
+        if not 0 <= score <= 5:
+            return JsonResponse(
+                {"score": ["Ensure the score is an integer between 0 and 5."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            if settings.VOTE_INGESTION_ASYNC:
+                reverse = await sync_to_async(limit_velocity)(user, [post.pk])
+                token = await sync_to_async(enqueue_vote)(
+                    user_id=user.pk, post_id=post.pk, score=score, reverse=reverse,
+                )
+                serializer = VoteStatusSerializer({"token": token, "status": PENDING})
+                return JsonResponse(serializer.data, status=status.HTTP_202_ACCEPTED, encoder=JSONEncoder)
+
+            vote = await sync_to_async(user.vote)(post=post, score=score)
+        except VelocityExceeded as exception:
+            response = JsonResponse({"detail": str(exception)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response["Retry-After"] = str(math.ceil(exception.retry_after))
+            return response
+        return JsonResponse(CastVoteSerializer(instance=vote).data, encoder=JSONEncoder)
+
+
+class MetricsView(View):
+    def get(self, request, *args, **kwargs):
+        if settings.METRICS_TOKEN and not hmac.compare_digest(
+                request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}",
+        ):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -2,6 +2,8 @@ import os
 
 from celery import Celery
 from celery.schedules import crontab
+from datetime import timedelta
+from django.conf import settings
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blog.settings")
@@ -13,6 +15,25 @@ app.autodiscover_tasks()
 app.conf.beat_schedule = {
     "fraud_detection": {
         "task": "app.tasks.fraud_detection",
-        "schedule": crontab(minute="*/30"),
+        "schedule": crontab(),
+    },
+    "fold_post_summary_shards": {
+        "task": "app.tasks.fold_post_summary_shards",
+        "schedule": crontab(),
+    },
+    "compact_votes": {
+        "task": "app.tasks.compact_votes",
+        "schedule": crontab(minute=30),
+    },
+    "prune_score_buckets": {
+        "task": "app.tasks.prune_score_buckets",
+        "schedule": crontab(minute=0),
     },
 }
+
+# The queue only fills when votes are ingested asynchronously, so the drain isn't polled every second otherwise
+if settings.VOTE_INGESTION_ASYNC:
+    app.conf.beat_schedule["drain_vote_queue"] = {
+        "task": "app.tasks.drain_vote_queue",
+        "schedule": timedelta(seconds=1),
+    }
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import sys
+from datetime import timedelta
 from pathlib import Path
 from decouple import config, Csv
 
@@ -39,12 +41,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'rest_framework.authtoken',
     'drf_spectacular',
     'app',
     'utils',
 ]
 
 MIDDLEWARE = [
+    'app.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,11 +77,19 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'blog.wsgi.application'
+ASGI_APPLICATION = 'blog.asgi.application'
+
+# Serve the listing and voting endpoints with native async views, for ASGI deployments
+ASYNC_VIEWS = config("ASYNC_VIEWS", cast=bool, default=False)
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+DATABASE_POOL = config("DATABASE_POOL", cast=bool, default=False)
+
+TESTING = sys.argv[1:2] == ["test"]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -86,9 +98,54 @@ DATABASES = {
         'PASSWORD': config("DATABASE_PASSWORD"),
         'HOST': config("DATABASE_HOST"),
         'PORT': config("DATABASE_PORT"),
+        # Pooled connections are returned after every request, so they can't be persistent as well.
+        # The app is served under ASGI, where persistent connections pile up per thread rather than
+        # being reused, so they are off unless a WSGI deployment asks for them.
+        'CONN_MAX_AGE': 0 if DATABASE_POOL else config("DATABASE_CONN_MAX_AGE", cast=int, default=0),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': config("DATABASE_POOL_MIN_SIZE", cast=int, default=2),
+                'max_size': config("DATABASE_POOL_MAX_SIZE", cast=int, default=20),
+            },
+        } if DATABASE_POOL else {},
+    }
+}
+
+# Lag tolerant reads, i.e. the post listing and the fraud detection scans, go to this replica while
+# its replication lag stays under DATABASE_REPLICA_MAX_LAG seconds. Tests get a mirror of the
+# test database under the same alias, which they route reads to with DATABASE_REPLICA="replica"
+DATABASE_REPLICA_HOST = config("DATABASE_REPLICA_HOST", default="")
+if DATABASE_REPLICA_HOST or TESTING:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DATABASE_REPLICA_HOST or DATABASES['default']['HOST'],
+        'PORT': config("DATABASE_REPLICA_PORT", default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICA = "replica" if DATABASE_REPLICA_HOST else None
+DATABASE_REPLICA_MAX_LAG = 10
+DATABASE_REPLICA_LAG_CHECK_INTERVAL = 5
+DATABASE_ROUTERS = ["app.routers.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config("CACHE_URL", default="redis://redis:6379/1"),
     }
 }
 
+if TESTING:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+
+CACHE_TIMEOUT = config("CACHE_TIMEOUT", cast=int, default=300)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -135,11 +192,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'app.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+AUTH_TOKEN_CACHE_TIMEOUT = 300
+
+PAGINATION_PAGE_SIZE = 20
+PAGINATION_MAX_PAGE_SIZE = 100
+
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'API Documentation',
@@ -163,5 +226,65 @@ AUTH_USER_MODEL = "app.User"
 
 CELERY_BROKER_URL = "redis://redis:6379"
 CELERY_RESULT_BACKEND = "redis://redis:6379"
+CELERY_TASK_ALWAYS_EAGER = TESTING
+
+VOTE_INGESTION_ASYNC = config("VOTE_INGESTION_ASYNC", cast=bool, default=False)
+VOTE_QUEUE_URL = None if TESTING else config("VOTE_QUEUE_URL", default=CELERY_BROKER_URL)
+VOTE_QUEUE_KEY = "vote-queue"
+VOTE_QUEUE_PROCESSING_KEY = "vote-queue:processing"
+VOTE_QUEUE_DEAD_LETTER_KEY = "vote-queue:dead"
+VOTE_QUEUE_DRAIN_TIMEOUT = 60
+VOTE_STATUS_TIMEOUT = 3600
 
 Z_SCORE_THRESHOLD = 2
+FRAUD_DETECTION_WINDOW = timedelta(minutes=30)
+FRAUD_DETECTION_BASELINE_WINDOW = timedelta(hours=24)
+FRAUD_DETECTION_SETTLE_TIME = timedelta(seconds=5)
+FRAUD_DETECTION_TRIGGER_VOTES = 1000
+FRAUD_DETECTION_LOCK_TIMEOUT = 600
+# Posts with fewer baseline votes are scored against their tags, then against every vote
+FRAUD_DETECTION_MIN_POST_VOTES = 30
+FRAUD_DETECTION_TAG_BASELINE = True
+# "numpy" scores the whole window with array operations, "python" one vote at a time
+FRAUD_DETECTION_BACKEND = "numpy"
+# Posts are split by hash across this many Celery tasks, which run as a chord
+FRAUD_DETECTION_SHARDS = 1 if TESTING else config("FRAUD_DETECTION_SHARDS", default=8, cast=int)
+# A vote is reversed when any of these detectors flags it. "mad" scores against the median
+# and median absolute deviation, e.g. {"threshold": 3.5}, and "ewma" against per-post
+# exponentially weighted moving averages, e.g. {"threshold": 3, "alpha": 0.05, "min_votes": 30}
+FRAUD_DETECTORS = {
+    "z_score": {"threshold": Z_SCORE_THRESHOLD},
+}
+SCORE_BUCKET_SIZE = timedelta(minutes=15)
+
+# Votes older than this are compacted into daily score histograms and the vote archive, at most
+# VOTE_RETENTION_TIME_LIMIT seconds per hourly run; 0 days keeps every vote in the votes table
+VOTE_RETENTION_DAYS = config("VOTE_RETENTION_DAYS", default=90, cast=int)
+VOTE_RETENTION_AGE = timedelta(days=VOTE_RETENTION_DAYS) if VOTE_RETENTION_DAYS else None
+VOTE_RETENTION_CHUNK_SIZE = 5000
+VOTE_RETENTION_TIME_LIMIT = 300
+
+VOTE_BATCH_MAX_SIZE = 500
+
+# Seconds each process buffers its metrics before adding them to the shared counters in the cache
+METRICS_FLUSH_INTERVAL = 0 if TESTING else 1
+# When set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Vote requests per user allowed within each sliding window, counted in the cache. A bulk request
+# counts as one, so batches up to VOTE_BATCH_MAX_SIZE pass whatever their size
+VOTE_VELOCITY_LIMITS = [
+    (timedelta(seconds=10), 20),
+    (timedelta(minutes=10), 300),
+]
+# Votes on a single post allowed within each window from accounts younger than the age below
+VOTE_VELOCITY_NEW_ACCOUNT_AGE = timedelta(days=1)
+VOTE_VELOCITY_NEW_ACCOUNT_LIMITS = [
+    (timedelta(minutes=1), 30),
+]
+# "reject" answers 429 to votes over a limit, "reverse" accepts them and reverses them shortly after
+VOTE_VELOCITY_ACTION = config("VOTE_VELOCITY_ACTION", default="reject")
+
+POST_SUMMARY_SHARDS = 16
+POST_SUMMARY_SHARDING_THRESHOLD = 200
+POST_SUMMARY_SHARDING_WINDOW = timedelta(seconds=10)
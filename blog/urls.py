@@ -17,11 +17,14 @@ Including another URLconf
 from django.urls import path, include
 from drf_spectacular.views import SpectacularJSONAPIView, SpectacularRedocView, SpectacularSwaggerView
 
+from app.views import MetricsView
+
 
 urlpatterns = [
     path("api/v1/", include("app.urls"), name="api"),
     path("swagger.json", SpectacularJSONAPIView.as_view(), name="schema"),
     path('swagger/', SpectacularSwaggerView.as_view(url_name="schema"), name='schema-swagger-ui'),
     path('redoc/', SpectacularRedocView.as_view(url_name="schema"), name='schema-redoc'),
+    path("metrics", MetricsView.as_view(), name="metrics"),
 
 ]
@@ -6,7 +6,8 @@ case "$SERVICE" in
       python manage.py migrate
       python manage.py collectstatic --noinput
 
-      gunicorn blog.wsgi:application --bind 0.0.0.0:8000
+      gunicorn blog.asgi:application --bind 0.0.0.0:8000 \
+         --worker-class uvicorn.workers.UvicornWorker --workers "${WEB_WORKERS:-4}"
    ;;
     "celery_worker")
       celery -A blog worker -Q celery -n main_worker -l INFO --concurrency=30
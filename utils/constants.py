@@ -4,3 +4,11 @@ from enum import Enum
 class Namespace(Enum):
     POST = "Post"
     USER = "User"
+
+
+class VoteStatus(Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    UNCHANGED = "unchanged"
+    SUPERSEDED = "superseded"
+    REJECTED = "rejected"